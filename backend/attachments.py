@@ -0,0 +1,143 @@
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db, ChatUpload
+
+# Chunked, resumable chat attachment uploads.
+#
+# A client initiates an upload with the file's name, size and SHA-256, then
+# PUTs numbered chunks in any order and as many times as it needs. Each
+# chunk is streamed to its own file under <upload folder>/.partial/<id>/,
+# so the chunks received so far survive a dropped connection or a
+# different worker, and nothing is buffered in memory. Committing
+# concatenates the chunks while hashing them and moves the result next to
+# the other attachments.
+
+UPLOAD_FOLDER = 'uploads'
+COPY_BUFFER = 64 * 1024
+
+
+class InvalidChunk(Exception):
+    pass
+
+
+class IncompleteUpload(Exception):
+    pass
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def upload_folder():
+    # إنشاء مجلد التحميل إذا لم يكن موجودًا
+    folder = os.path.join(current_app.root_path, current_app.config.get('CHAT_UPLOAD_FOLDER', UPLOAD_FOLDER))
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def partial_dir(upload_id):
+    return os.path.join(upload_folder(), '.partial', upload_id)
+
+
+def chunk_count(upload):
+    return max(1, -(-upload.size // upload.chunk_size))
+
+
+def chunk_length(upload, index):
+    """Expected size of chunk ``index``, only the last one may be shorter."""
+    if index == chunk_count(upload) - 1:
+        return upload.size - index * upload.chunk_size
+    return upload.chunk_size
+
+
+def create(group_id, filename, size, sha256):
+    upload = ChatUpload(
+        id=uuid.uuid4().hex,
+        group_id=group_id,
+        filename=filename,
+        size=size,
+        sha256=sha256.lower(),
+        chunk_size=current_app.config.get('CHAT_UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024)
+    )
+    db.session.add(upload)
+    db.session.commit()
+    os.makedirs(partial_dir(upload.id), exist_ok=True)
+    return upload
+
+
+def received_chunks(upload):
+    try:
+        names = os.listdir(partial_dir(upload.id))
+    except FileNotFoundError:
+        return []
+    return sorted(int(name) for name in names if name.isdigit())
+
+
+def write_chunk(upload, index, stream):
+    """Stream chunk ``index`` to disk, replacing an earlier copy of it."""
+    if not 0 <= index < chunk_count(upload):
+        raise InvalidChunk("Chunk index out of range")
+    expected = chunk_length(upload, index)
+
+    directory = partial_dir(upload.id)
+    tmp_path = os.path.join(directory, f'{index}.{uuid.uuid4().hex}.tmp')
+    try:
+        written = 0
+        with open(tmp_path, 'wb') as f:
+            while data := stream.read(min(COPY_BUFFER, expected + 1 - written)):
+                written += len(data)
+                if written > expected:
+                    raise InvalidChunk(f"Chunk {index} must be {expected} bytes")
+                f.write(data)
+        if written != expected:
+            raise InvalidChunk(f"Chunk {index} must be {expected} bytes")
+        # Readers only ever see complete chunks
+        os.replace(tmp_path, os.path.join(directory, str(index)))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def assemble(upload, destination):
+    """Concatenate the chunks into ``destination`` and verify the checksum."""
+    missing = set(range(chunk_count(upload))) - set(received_chunks(upload))
+    if missing:
+        raise IncompleteUpload(sorted(missing))
+
+    sha256 = hashlib.sha256()
+    directory = partial_dir(upload.id)
+    tmp_path = f'{destination}.{uuid.uuid4().hex}.tmp'
+    try:
+        with open(tmp_path, 'wb') as out:
+            for index in range(chunk_count(upload)):
+                with open(os.path.join(directory, str(index)), 'rb') as chunk:
+                    while data := chunk.read(COPY_BUFFER):
+                        sha256.update(data)
+                        out.write(data)
+        if sha256.hexdigest() != upload.sha256:
+            raise ChecksumMismatch()
+        os.replace(tmp_path, destination)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def discard(upload_id):
+    shutil.rmtree(partial_dir(upload_id), ignore_errors=True)
+
+
+def expire():
+    """Drop uploads not committed within CHAT_UPLOAD_EXPIRY seconds."""
+    expiry = timedelta(seconds=current_app.config.get('CHAT_UPLOAD_EXPIRY', 86400))
+    stale = [row.id for row in db.session.query(ChatUpload.id)
+             .filter(ChatUpload.created_at < datetime.utcnow() - expiry)]
+    if stale:
+        ChatUpload.query.filter(ChatUpload.id.in_(stale)).delete(synchronize_session=False)
+        db.session.commit()
+    for upload_id in stale:
+        discard(upload_id)
+    return len(stale)
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import g
+from flask_jwt_extended import get_jwt_identity
+from models import db, User, user_courses
+
+# The authenticated caller, as most handlers need it: who they are and which
+# courses they are enrolled in.
+#
+# It is resolved once per request and kept in a small process-local cache
+# for AUTH_CACHE_TTL seconds. Enrolling, unenrolling and profile updates
+# invalidate the entry in the worker that handled them; other workers catch
+# up when the entry expires. A course missing from the cached list is
+# checked against the database before access is denied, so a student who
+# just enrolled through another worker is never turned away.
+
+CurrentUser = namedtuple('CurrentUser', ['id', 'username', 'course_ids'])
+
+
+class AuthContext:
+    """TTL cache of ``CurrentUser`` tuples keyed by user id."""
+
+    def __init__(self, app=None):
+        self.ttl = 10
+        self.max_entries = 4096
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, a load that overlaps one is not cached
+        self._generation = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('AUTH_CACHE_TTL', 10)
+        self.max_entries = app.config.get('AUTH_CACHE_SIZE', 4096)
+        app.extensions['auth_context'] = self
+
+    def _load(self, user_id):
+        row = db.session.query(User.id, User.username).filter_by(id=user_id).first()
+        if row is None:
+            return None
+        course_ids = tuple(sorted(course_id for course_id, in db.session.query(user_courses.c.courseId)
+                                  .filter(user_courses.c.user_id == user_id)))
+        return CurrentUser(row.id, row.username, course_ids)
+
+    def get(self, user_id):
+        """The ``CurrentUser`` for ``user_id``, or None if there is no such user."""
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+            generation = self._generation
+
+        user = self._load(user_id)
+        if user is not None and self.ttl:
+            with self._lock:
+                if generation != self._generation:
+                    return user
+                self._entries[user_id] = (now + self.ttl, user)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return user
+
+    def current(self):
+        """The caller of a ``jwt_required`` view, resolved once per request."""
+        if 'auth_user' not in g:
+            g.auth_user = self.get(get_jwt_identity())
+        return g.auth_user
+
+    def is_enrolled(self, user, course_id):
+        if course_id in user.course_ids:
+            return True
+        # The cached list may predate an enrollment made through another worker
+        enrolled = db.session.query(user_courses.c.user_id)\
+            .filter_by(user_id=user.id, courseId=course_id).first() is not None
+        if enrolled:
+            self.invalidate(user.id)
+        return enrolled
+
+    def invalidate(self, *user_ids):
+        """Drop the cached users, call after committing a change to them."""
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(int(user_id), None)
+        if 'auth_user' in g and g.auth_user is not None and g.auth_user.id in user_ids:
+            g.pop('auth_user')
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+        g.pop('auth_user', None)
+
+
+auth_context = AuthContext()
+
+
+def current_user():
+    return auth_context.current()
@@ -0,0 +1,98 @@
+"""Chat load test with a connection per request and with the shared pool.
+
+    python bench/chat_pool.py [--clients 32] [--seconds 5]
+
+Serves the chat blueprint from a threaded server and has ``--clients``
+threads read and post group messages over HTTP. Runs once with
+NullPool, which opens and closes a database connection for every request
+like the standalone chat app did, and once with the app's pool. Prints
+the connections opened, requests per second and p50/p99 latency. The gap
+is widest against a networked database, so point BENCH_DATABASE_URL at
+a scratch MySQL server for representative numbers.
+"""
+import argparse
+import http.client
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+from werkzeug.serving import make_server
+
+from common import database_url, make_app, summary
+from config import Config, engine_options
+from models import db, ChatGroup, GroupMessage
+
+
+def without_pool(url):
+    options = engine_options(dict(vars(Config), SQLALCHEMY_DATABASE_URI=url))
+    for name in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle'):
+        options.pop(name, None)
+    return dict(options, poolclass=NullPool)
+
+
+def run(label, pooled, clients, seconds, groups=10):
+    url = database_url()
+    app = make_app(SQLALCHEMY_DATABASE_URI=url, **({} if pooled else {'SQLALCHEMY_ENGINE_OPTIONS': without_pool(url)}))
+    with app.app_context():
+        db.session.add_all([ChatGroup(id=i, name=f'group {i}') for i in range(1, groups + 1)])
+        db.session.flush()
+        db.session.add_all([GroupMessage(group_id=i % groups + 1, sender='seed', message=f'message {i}')
+                            for i in range(groups * 50)])
+        db.session.commit()
+        engine = db.engine
+        engine.dispose()
+
+    connects = []
+    event.listen(engine, 'connect', lambda *args: connects.append(1))
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    latencies = []
+    errors = []
+    stop = time.monotonic() + seconds
+
+    def client(number):
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+        i = 0
+        while time.monotonic() < stop:
+            i += 1
+            group_id = (number + i) % groups + 1
+            start = time.perf_counter()
+            if i % 5:
+                connection.request('GET', f'/chat/{group_id}?limit=20')
+            else:
+                connection.request('POST', f'/chat/{group_id}', body=urlencode({'sender': f'c{number}', 'message': 'hi'}),
+                                   headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            response = connection.getresponse()
+            response.read()
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status >= 400:
+                errors.append(response.status)
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    print(f'{label}: {len(connects)} connections opened for {len(latencies)} requests, '
+          f'{len(latencies) / seconds:.0f} req/s, {summary(latencies)}, {len(errors)} errors')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    run('connection per request', False, args.clients, args.seconds)
+    run('shared pool', True, args.clients, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
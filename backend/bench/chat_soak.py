@@ -0,0 +1,159 @@
+"""Soak test of idle chat stream subscribers.
+
+    python bench/chat_soak.py [--subscribers 2000]
+    python bench/chat_soak.py --url http://127.0.0.1:5000 --pid <server pid> --group 1
+
+Opens ``--subscribers`` idle /chat/stream connections, measures the
+server's resident memory per connection, then posts one message and times
+how long it takes to reach every subscriber. Without --url it starts the
+app on a threaded development server in a child process. With --url and
+--pid it measures a running server instead, e.g. gunicorn started with
+GUNICORN_WORKER_CLASS=gevent. For comparison it prints the database
+statements the same clients would cause by polling GET /chat/<group_id>
+every 5 seconds instead. Linux only, it reads /proc for memory.
+"""
+import argparse
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import urlencode, urlparse
+
+from sqlalchemy import event
+
+from common import make_app
+
+POLL_INTERVAL = 5
+
+
+def rss_kib(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def tree_rss_kib(pid):
+    """Resident memory of ``pid`` and its children, gunicorn's workers included."""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    return sum(rss_kib(p) for p in pids)
+
+
+def serve(port):
+    import logging
+    from werkzeug.serving import make_server
+    from models import db, ChatGroup
+    app = make_app()
+    with app.app_context():
+        db.session.add(ChatGroup(id=1, name='soak'))
+        db.session.commit()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    print('ready', flush=True)
+    server.serve_forever()
+
+
+def open_streams(host, port, group, count):
+    selector = selectors.DefaultSelector()
+    request = f'GET /chat/stream?groups={group} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n'.encode()
+    for i in range(count):
+        sock = socket.create_connection((host, port))
+        sock.sendall(request)
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ, bytearray())
+        if i % 200 == 199:
+            time.sleep(0.05)
+    return selector
+
+
+def drain(selector, until, stop_when=None):
+    """Read whatever arrives until ``until`` or ``stop_when(buffers)`` is true."""
+    while time.monotonic() < until:
+        for key, _ in selector.select(timeout=0.1):
+            try:
+                data = key.fileobj.recv(65536)
+            except BlockingIOError:
+                continue
+            key.data.extend(data)
+        if stop_when and stop_when([key.data for key in selector.get_map().values()]):
+            return True
+    return False
+
+
+def polling_statements(count):
+    """Statements per second ``count`` clients polling one group every POLL_INTERVAL seconds cause."""
+    app = make_app()
+    from models import db, ChatGroup
+    with app.app_context():
+        db.session.add(ChatGroup(id=1, name='poll'))
+        db.session.commit()
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(1))
+    client = app.test_client()
+    client.get('/chat/1?since_id=0')
+    return len(statements) * count / POLL_INTERVAL
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--url')
+    parser.add_argument('--pid', type=int)
+    parser.add_argument('--group', type=int, default=1)
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.serve)
+
+    child = None
+    if args.url:
+        url, pid = args.url, args.pid
+    else:
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port)],
+                                 stdout=subprocess.PIPE, text=True)
+        child.stdout.readline()
+        url, pid = f'http://127.0.0.1:{port}', child.pid
+
+    try:
+        parsed = urlparse(url)
+        time.sleep(1)
+        base = tree_rss_kib(pid) if pid else 0
+        selector = open_streams(parsed.hostname, parsed.port, args.group, args.subscribers)
+        drain(selector, time.monotonic() + 3)
+        connected = sum(1 for key in selector.get_map().values() if b'retry:' in key.data)
+        print(f'{connected} of {args.subscribers} subscribers connected')
+        if pid:
+            grown = tree_rss_kib(pid) - base
+            print(f'server memory: +{grown / 1024:.1f} MiB, {grown * 1024 / max(connected, 1):.0f} bytes per subscriber')
+
+        start = time.monotonic()
+        body = urlencode({'sender': 'soak', 'message': 'hello'}).encode()
+        urllib.request.urlopen(urllib.request.Request(f'{url}/chat/{args.group}', data=body)).read()
+        delivered = drain(selector, start + 30, lambda buffers: all(b'message.created' in data for data in buffers))
+        received = sum(1 for key in selector.get_map().values() if b'message.created' in key.data)
+        print(f'message reached {received} subscribers in {time.monotonic() - start:.2f} s'
+              + ('' if delivered else ' (timed out)'))
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+    finally:
+        if child:
+            child.terminate()
+
+    print(f'polling every {POLL_INTERVAL} s instead: {polling_statements(args.subscribers):.0f} statements/s '
+          f'for {args.subscribers} clients')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Shared setup of the benchmark scripts in this directory.
+
+Run them from backend/, e.g. ``python bench/indexes.py``. They use a
+throwaway SQLite file unless BENCH_DATABASE_URL points at a scratch
+database, which they drop and recreate.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+
+def database_url():
+    url = os.getenv('BENCH_DATABASE_URL')
+    if url:
+        return url
+    return 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='foodle-bench-'), 'bench.db')
+
+
+def make_app(**config):
+    """A fresh app on an empty database, with the settings under test in ``config``."""
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': database_url(),
+        'SECRET_KEY': 'bench',
+        'JWT_SECRET_KEY': 'bench-secret-key-of-at-least-32-bytes',
+        'KARMA_FLUSH_INTERVAL': 0,
+        'PASSWORD_HASH_WORKERS': 0,
+        'COMPRESS_ENABLED': False,
+    }
+    settings.update(config)
+    app = create_app(settings)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def auth_header(app, user_id):
+    with app.app_context():
+        return {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+
+
+def best_of(fn, repeat=5):
+    """Fastest of ``repeat`` runs of ``fn()``, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def summary(latencies):
+    """``p50 / p99`` of latencies in milliseconds."""
+    return f'p50 {statistics.median(latencies):.1f} ms, p99 {percentile(latencies, 99):.1f} ms'
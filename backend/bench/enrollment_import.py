@@ -0,0 +1,65 @@
+"""Time to load 100k enrollments, one request each and through the bulk import.
+
+    python bench/enrollment_import.py [--students 10000] [--courses 10] [--sample 2000]
+
+Seeds ``--students`` users and ``--courses`` courses, then enrolls every
+student in every course from an NDJSON file with import_enrollments, the
+code behind POST /api/admin/enrollments/import and ``flask
+import-enrollments``. For comparison it enrolls ``--sample`` pairs
+through POST /api/enroll, one request per pair as before, and
+extrapolates to the full file.
+"""
+import argparse
+import io
+import json
+import time
+
+from sqlalchemy import func
+
+from common import auth_header, make_app
+import bulk_import
+from models import db, User, Course, user_courses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=10000)
+    parser.add_argument('--courses', type=int, default=10)
+    parser.add_argument('--sample', type=int, default=2000)
+    args = parser.parse_args()
+    pairs = args.students * args.courses
+
+    app = make_app(FEED_CACHE_TYPE='null')
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            dict(id=i, username=f'student{i}', password_hash='x') for i in range(1, args.students + 1)])
+        db.session.execute(Course.__table__.insert(), [
+            dict(id=i, name=f'Course {i}', code=f'C{i}', description='d', instructor='i')
+            for i in range(1, args.courses + 1)])
+        db.session.commit()
+
+    # One request per enrollment, for the first students of the first course
+    client = app.test_client()
+    start = time.perf_counter()
+    for user_id in range(1, args.sample + 1):
+        response = client.post('/api/enroll', json={'courseId': 1}, headers=auth_header(app, user_id))
+        assert response.status_code == 200, response.get_json()
+    per_request = time.perf_counter() - start
+    print(f'POST /api/enroll: {args.sample} enrollments in {per_request:.1f} s, '
+          f'{args.sample / per_request:.0f}/s, {pairs} would take about {per_request / args.sample * pairs:.0f} s')
+
+    lines = [json.dumps({'username': f'student{user_id}', 'courseCode': f'C{course_id}'}).encode() + b'\n'
+             for course_id in range(1, args.courses + 1) for user_id in range(1, args.students + 1)]
+    with app.app_context():
+        start = time.perf_counter()
+        report = bulk_import.import_enrollments(io.BytesIO(b''.join(lines)), 'ndjson').to_dict()
+        elapsed = time.perf_counter() - start
+        total = db.session.query(func.count()).select_from(user_courses).scalar()
+    print(f'bulk import: {report["processed"]} rows in {elapsed:.1f} s, {report["processed"] / elapsed:.0f}/s '
+          f'({report["created"]} created, {report["unchanged"]} already enrolled, {report["errorCount"]} errors, '
+          f'chunks of {app.config["BULK_IMPORT_CHUNK_SIZE"]})')
+    assert total == pairs
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Feed query plans and latency without and with the composite indexes.
+
+    python bench/indexes.py [--posts 20000]
+
+Seeds courses, posts, comments and likes, then serves course and author
+feeds twice: once with the secondary indexes dropped, as before the
+migration, and once with them in place. For each feed it prints the query
+plan of the page query and the latency of the first page and a deep page.
+The primary keys of the association tables stay in both runs.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+
+from common import auth_header, make_app, summary
+from models import db, User, Course, Post, Comment, post_likes, user_courses
+
+INDEXES = [
+    (Post.__table__, 'ix_post_course_timestamp'),
+    (Post.__table__, 'ix_post_user_timestamp'),
+    (Comment.__table__, 'ix_comment_post_timestamp'),
+    (post_likes, 'ix_post_likes_post_id'),
+    (user_courses, 'ix_user_courses_courseId'),
+]
+
+
+def seed(app, posts, users=200, courses=40):
+    random.seed(1)
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            dict(id=i, username=f'user{i}', password_hash='x', karma=0) for i in range(1, users + 1)])
+        db.session.execute(Course.__table__.insert(), [
+            dict(id=i, name=f'Course {i}', code=f'C{i}', description='d', instructor='i') for i in range(1, courses + 1)])
+        db.session.execute(user_courses.insert(), [
+            dict(user_id=user_id, courseId=course_id)
+            for user_id in range(1, users + 1) for course_id in random.sample(range(1, courses + 1), 4)])
+        start = datetime(2024, 1, 1)
+        db.session.execute(Post.__table__.insert(), [
+            dict(id=i, content=f'post {i}', user_id=random.randint(1, users), courseId=random.randint(1, courses),
+                 timestamp=start + timedelta(minutes=i), likes=0) for i in range(1, posts + 1)])
+        db.session.execute(Comment.__table__.insert(), [
+            dict(content='comment', user_id=random.randint(1, users), post_id=random.randint(1, posts),
+                 timestamp=start + timedelta(minutes=i)) for i in range(posts * 2)])
+        db.session.execute(post_likes.insert().prefix_with('OR IGNORE', dialect='sqlite').prefix_with('IGNORE', dialect='mysql'), [
+            dict(user_id=random.randint(1, users), post_id=random.randint(1, posts)) for _ in range(posts * 2)])
+        db.session.commit()
+
+
+def set_indexes(app, present):
+    with app.app_context():
+        for table, name in INDEXES:
+            index = next(index for index in table.indexes if index.name == name)
+            try:
+                if present:
+                    index.create(db.engine, checkfirst=True)
+                else:
+                    index.drop(db.engine, checkfirst=True)
+            except Exception as e:
+                print(f'  could not {"create" if present else "drop"} {name}: {e.__class__.__name__}')
+
+
+def explain(app, statement, parameters):
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+        with db.engine.connect() as connection:
+            rows = connection.exec_driver_sql(prefix + statement, parameters).fetchall()
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail)
+        return ['    ' + row[-1] for row in rows]
+    return ['    ' + ' | '.join(str(value) for value in row) for row in rows]
+
+
+def measure(app, client, headers, url, requests=50):
+    """Plan of the page query of ``url`` and latencies of its first and a deep page."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'ORDER BY post.timestamp DESC' in statement and not captured:
+            captured.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    first = client.get(url, query_string={'limit': 20}, headers=headers).get_json()
+    event.remove(engine, 'before_cursor_execute', capture)
+
+    # Walk ten pages down for the deep page cursor
+    cursor = first['nextCursor']
+    for _ in range(9):
+        cursor = client.get(url, query_string={'limit': 20, 'before': cursor}, headers=headers).get_json()['nextCursor']
+
+    results = {}
+    for label, query in (('first page', {'limit': 20}), ('page 11', {'limit': 20, 'before': cursor})):
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            assert client.get(url, query_string=query, headers=headers).status_code == 200
+            latencies.append((time.perf_counter() - start) * 1000)
+        results[label] = latencies
+    return explain(app, *captured[0]), results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = make_app(FEED_CACHE_TYPE='null')
+    seed(app, args.posts)
+    client = app.test_client()
+    headers = auth_header(app, 1)
+    feeds = {'course feed': '/api/courses/7/posts', 'author feed': '/api/users/7/posts'}
+
+    medians = {}
+    for present in (False, True):
+        set_indexes(app, present)
+        with app.app_context():
+            if db.engine.dialect.name == 'sqlite':
+                with db.engine.begin() as connection:
+                    connection.execute(text('ANALYZE'))
+        print(f'\n{"With" if present else "Without"} indexes ({args.posts} posts)')
+        for name, url in feeds.items():
+            plan, results = measure(app, client, headers, url)
+            print(f'  {name} {url}')
+            print('\n'.join(plan))
+            for label, latencies in results.items():
+                print(f'    {label}: {summary(latencies)}')
+                medians[present, name, label] = statistics.median(latencies)
+
+    print('\nMedian speedup')
+    for name in feeds:
+        for label in ('first page', 'page 11'):
+            print(f'  {name}, {label}: {medians[False, name, label] / medians[True, name, label]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
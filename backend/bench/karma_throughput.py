@@ -0,0 +1,84 @@
+"""Like throughput with karma written per like and through the write-behind buffer.
+
+    python bench/karma_throughput.py [--threads 8] [--seconds 5]
+
+Every thread likes and unlikes posts of one popular author, the row the
+buffer is meant to take off the hot path. Runs once with
+KARMA_FLUSH_INTERVAL=0, which writes each delta in the like's own
+transaction like before, and once with the buffer on. Prints likes per
+second, how many UPDATEs hit the author's row and whether the karma
+endpoint matches the database after the final flush.
+"""
+import argparse
+import threading
+import time
+
+from sqlalchemy import event
+
+from common import auth_header, make_app, summary
+from karma import karma_buffer
+from models import db, User, Course, Post
+
+
+def run(interval, threads, seconds, posts=50):
+    app = make_app(KARMA_FLUSH_INTERVAL=interval, FEED_CACHE_TYPE='null')
+    with app.app_context():
+        db.session.add_all([User(id=i, username=f'user{i}', password_hash='x', karma=0) for i in range(1, threads + 2)])
+        db.session.add(Course(id=1, name='Course', code='C1', description='d', instructor='i'))
+        db.session.flush()
+        db.session.add_all([Post(id=i, content='post', user_id=1, courseId=1, likes=0) for i in range(1, posts + 1)])
+        db.session.commit()
+        engine = db.engine
+
+    karma_updates = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE user SET karma'):
+            karma_updates.append(1)
+
+    event.listen(engine, 'before_cursor_execute', count)
+
+    latencies = []
+    stop = time.monotonic() + seconds
+
+    def like(user_id):
+        client = app.test_client()
+        headers = auth_header(app, user_id)
+        post_id = 0
+        while time.monotonic() < stop:
+            post_id = post_id % posts + 1
+            start = time.perf_counter()
+            assert client.post(f'/api/post/{post_id}/like', headers=headers).status_code == 200
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    workers = [threading.Thread(target=like, args=(user_id,)) for user_id in range(2, threads + 2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    client = app.test_client()
+    reported = client.get('/api/users/1/karma', headers=auth_header(app, 1)).get_json()
+    with app.app_context():
+        karma_buffer.flush()
+        stored = db.session.query(User.karma).filter_by(id=1).scalar()
+        likes = sum(likes for likes, in db.session.query(Post.likes))
+    event.remove(engine, 'before_cursor_execute', count)
+
+    label = 'per like' if not interval else f'buffered ({interval:g} s)'
+    print(f'{label}: {len(latencies) / seconds:.0f} likes/s, {summary(latencies)}, '
+          f'{len(karma_updates)} UPDATEs of the author for {len(latencies)} likes')
+    print(f'  endpoint before flush {reported}, stored after flush {stored}, likes {likes}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+    for interval in (0, 2):
+        run(interval, args.threads, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Login throughput and feed latency under a login burst.
+
+    python bench/login_load.py [--logins 16] [--seconds 5] [--workers 2]
+
+Serves the app from a threaded server. ``--logins`` threads log in as
+fast as they can while one client reads /api/courses/my every 20 ms.
+Runs once hashing in the request threads, as before, and once with
+``--workers`` hashing processes. Prints successful logins per second,
+503 responses from the full queue and the feed's p50/p99 latency. The
+last run stores legacy pbkdf2 hashes and checks they are upgraded on
+login.
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from common import auth_header, make_app, summary
+from models import db, User
+from passwords import password_hasher
+
+METHOD = 'scrypt:32768:8:1'
+
+
+def run(workers, threads, seconds, legacy=False):
+    app = make_app(PASSWORD_HASH_WORKERS=workers, PASSWORD_HASH_METHOD=METHOD, PASSWORD_HASH_QUEUE_SIZE=8)
+    stored = generate_password_hash('password', 'pbkdf2:sha256:100000' if legacy else METHOD)
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            dict(id=i, username=f'user{i}', password_hash=stored) for i in range(1, threads + 2)])
+        db.session.commit()
+    headers = auth_header(app, threads + 1)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    def login(user_id):
+        request = urllib.request.Request(f'{base}/login', headers={'Content-Type': 'application/json'},
+                                         data=json.dumps({'username': f'user{user_id}', 'password': 'password'}).encode())
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    login(threads + 1)  # Starts the hashing processes
+    statuses = []
+    latencies = []
+    stop = time.monotonic() + seconds
+
+    def login_loop(user_id):
+        while time.monotonic() < stop:
+            statuses.append(login(user_id))
+
+    def feed_loop():
+        while time.monotonic() < stop:
+            start = time.perf_counter()
+            urllib.request.urlopen(urllib.request.Request(f'{base}/api/courses/my', headers=headers)).read()
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.02)
+
+    clients = [threading.Thread(target=login_loop, args=(user_id,)) for user_id in range(1, threads + 1)]
+    clients.append(threading.Thread(target=feed_loop))
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    server.shutdown()
+
+    label = 'in request threads' if not workers else f'{workers} hashing processes'
+    print(f'{label}: {statuses.count(200) / seconds:.1f} logins/s, {statuses.count(503)} x 503, '
+          f'feed {summary(latencies)} over {len(latencies)} requests')
+    if legacy:
+        with app.app_context():
+            hashes = [password_hash for password_hash, in db.session.query(User.password_hash)]
+        upgraded = sum(1 for password_hash in hashes if not password_hasher.needs_rehash(password_hash))
+        print(f'  {upgraded} of {len(hashes)} legacy pbkdf2 hashes upgraded, '
+              f'the others never got a login through the full queue')
+    # The next run starts its own processes
+    if password_hasher._executor is not None:
+        password_hasher._reset(password_hasher._executor)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    run(0, args.logins, args.seconds)
+    run(args.workers, args.logins, args.seconds)
+    run(args.workers, args.logins, args.seconds, legacy=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Upload bytes sent through Python by the default static handler and the media route.
+
+    python bench/media.py [--visitors 100] [--images 30] [--views 3]
+
+Every visitor views a page of ``--images`` uploads ``--views`` times,
+through a client that caches like a browser: it skips requests while the
+response is fresh by max-age and revalidates with If-None-Match
+otherwise. Heuristic freshness is not modelled, so the default handler is
+shown at its most cache-friendly: a 304 for every revisit. Compares
+Flask's default static handler, as before, with the media route, and the
+media route in MEDIA_SENDFILE=x-accel mode where nginx sends the bytes.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+from common import make_app
+
+
+def write_uploads(root, count, size):
+    uploads = os.path.join(root, 'static', 'uploads')
+    os.makedirs(uploads)
+    names = []
+    for i in range(count):
+        name = f'{i:064x}.jpg'
+        with open(os.path.join(uploads, name), 'wb') as f:
+            f.write(os.urandom(size))
+        # The thumbnail marks the original as final, like the image pipeline does
+        with open(os.path.join(uploads, f'{i:064x}_thumb.webp'), 'wb') as f:
+            f.write(b'thumb')
+        names.append(name)
+    return names
+
+
+def fresh_for(response):
+    cache_control = response.cache_control
+    if cache_control.no_cache or cache_control.max_age is None:
+        return 0
+    return cache_control.max_age
+
+
+def browse(app, names, visitors, views):
+    requests = bytes_sent = 0
+    for _ in range(visitors):
+        client = app.test_client()
+        cache = {}
+        for view in range(views):
+            now = view * 3600  # One view an hour
+            for name in names:
+                entry = cache.get(name)
+                if entry and now < entry['fetched'] + entry['fresh']:
+                    continue
+                headers = {'If-None-Match': entry['etag']} if entry and entry['etag'] else {}
+                response = client.get(f'/static/uploads/{name}', headers=headers)
+                requests += 1
+                bytes_sent += len(response.get_data())
+                if response.status_code in (200, 304):
+                    cache[name] = {'fetched': now, 'fresh': fresh_for(response),
+                                   'etag': response.headers.get('ETag') or (entry or {}).get('etag')}
+    return requests, bytes_sent
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--visitors', type=int, default=100)
+    parser.add_argument('--images', type=int, default=30)
+    parser.add_argument('--views', type=int, default=3)
+    parser.add_argument('--size', type=int, default=200 * 1024)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='foodle-media-')
+    names = write_uploads(root, args.images, args.size)
+
+    default = Flask('before', static_folder=os.path.join(root, 'static'))
+    media = make_app()
+    media.root_path = root
+    accel = make_app(MEDIA_SENDFILE='x-accel')
+    accel.root_path = root
+
+    print(f'{args.visitors} visitors x {args.views} views of {args.images} images of {args.size // 1024} KiB')
+    for label, app in (('default static handler', default), ('media route', media), ('media route, x-accel', accel)):
+        start = time.perf_counter()
+        requests, bytes_sent = browse(app, names, args.visitors, args.views)
+        elapsed = time.perf_counter() - start
+        print(f'  {label}: {requests} requests, {bytes_sent / 2**20:.1f} MiB through Python, {elapsed:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Microbenchmarks for serializing 10k posts.
+
+    python bench/serialize_posts.py [--posts 10000]
+
+Compares the hand-written dict comprehensions the routes used with the
+serializers module, the stdlib JSON encoder behind jsonify with the fast
+encoder (orjson when installed), and the peak memory of encoding the
+whole list with streaming it from a generator.
+"""
+import argparse
+import tracemalloc
+from datetime import datetime
+
+from flask.json.provider import DefaultJSONProvider
+
+from common import best_of, make_app
+from feed import feed_query
+from models import db, User, Course, Post, Comment
+from serializers import encode, image_variants, serialize_post, stream_json
+
+
+def old_serialize_post(post):
+    """The routes' comprehension, extended to the current wire shape."""
+    post_data = {
+        "id": str(post.id),
+        "content": post.content,
+        "createdAt": post.timestamp.isoformat(),
+        "userId": str(post.user_id),
+        "courseId": str(post.courseId),
+        "username": post.user.username,
+        "likes": post.likes or 0,
+        "comments": [{
+            "id": str(comment.id),
+            "content": comment.content,
+            "createdAt": comment.timestamp.isoformat(),
+            "userId": str(comment.user_id),
+            "postId": str(post.id),
+            "username": comment.user.username,
+            "likes": comment.likes or 0
+        } for comment in post.comments]
+    }
+    if post.image:
+        post_data["image"] = post.image
+        post_data["imageVariants"] = image_variants(post.image, post.image_upload)
+    return post_data
+
+
+def peak_mib(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=10000)
+    args = parser.parse_args()
+
+    app = make_app()
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.add(User(id=1, username='author', password_hash='x'))
+        db.session.add(Course(id=1, name='Course', code='C1', description='d', instructor='i'))
+        db.session.execute(Post.__table__.insert(), [
+            dict(id=i, content='post body ' * 20, user_id=1, courseId=1, timestamp=now, likes=i % 7)
+            for i in range(1, args.posts + 1)])
+        db.session.execute(Comment.__table__.insert(), [
+            dict(content='c' * 40, user_id=1, post_id=i, timestamp=now) for i in range(1, args.posts + 1, 2)])
+        db.session.commit()
+
+        posts = feed_query().all()
+        stdlib = DefaultJSONProvider(app)
+        data = [serialize_post(post) for post in posts]
+
+        print(f'{len(posts)} posts, best of 5, dict building best of 15')
+        print(f'  dicts, hand-written:    {best_of(lambda: [old_serialize_post(post) for post in posts], 15):7.1f} ms')
+        print(f'  dicts, serializers:     {best_of(lambda: [serialize_post(post) for post in posts], 15):7.1f} ms')
+        print(f'  encode, stdlib jsonify: {best_of(lambda: stdlib.dumps(data)):7.1f} ms')
+        print(f'  encode, fast encoder:   {best_of(lambda: encode(data)):7.1f} ms')
+        with app.test_request_context():
+            streamed = best_of(lambda: sum(len(chunk) for chunk in stream_json('posts', posts, serialize_post).response))
+            print(f'  serialize + stream:     {streamed:7.1f} ms')
+            print(f'  peak memory, whole body: {peak_mib(lambda: stdlib.dumps([old_serialize_post(post) for post in posts])):.1f} MiB')
+            print(f'  peak memory, streamed:   {peak_mib(lambda: [None for _ in stream_json("posts", posts, serialize_post).response]):.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
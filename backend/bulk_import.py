@@ -0,0 +1,238 @@
+import codecs
+import csv
+import json
+from itertools import islice
+from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.dialects import mysql, sqlite
+from models import db, User, Course, user_courses
+from catalog import course_catalog
+from auth_context import auth_context
+import timeline
+
+# Bulk import of courses and enrollments from the registrar.
+#
+# Input is CSV with a header row or NDJSON, one object per line, read as a
+# stream so a file of any size is never held in memory. Rows are taken in
+# chunks of BULK_IMPORT_CHUNK_SIZE: every chunk is validated with one query
+# per lookup, written with one multi-row upsert and committed, so a bad row
+# only costs its own line in the report and an interrupted import can simply
+# be run again.
+#
+# Courses are matched on code and their name, description and instructor
+# updated. Enrollments name the student by username or userId and the course
+# by courseCode or courseId; existing enrollments are left as they are.
+
+FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 1000
+MAX_FIELD_LENGTH = 128
+
+
+class ImportReport:
+    """Counts of an import and the errors of its first rejected rows."""
+
+    def __init__(self):
+        self.processed = 0
+        self.created = 0
+        self.unchanged = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "message": message})
+
+    def to_dict(self):
+        return {
+            "processed": self.processed,
+            "created": self.created,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "errorCount": self.error_count,
+            "errors": sorted(self.errors, key=lambda error: error["line"])
+        }
+
+
+def read_rows(lines, fmt, report):
+    """Yield ``(line, row)`` for each record of ``lines``, an iterable of bytes."""
+    text = codecs.iterdecode(lines, 'utf-8-sig')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            report.processed += 1
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line, raw in enumerate(text, start=1):
+            if not raw.strip():
+                continue
+            report.processed += 1
+            try:
+                row = json.loads(raw)
+            except ValueError:
+                report.error(line, "Invalid JSON")
+                continue
+            if not isinstance(row, dict):
+                report.error(line, "Expected a JSON object")
+                continue
+            yield line, row
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+
+def _chunks(rows):
+    size = current_app.config.get('BULK_IMPORT_CHUNK_SIZE', 1000)
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _field(row, *names):
+    """First non-empty value among ``names``, as a stripped string."""
+    for name in names:
+        value = row.get(name)
+        if value is not None and str(value).strip():
+            return str(value).strip()
+    return None
+
+
+def _upsert_courses(values):
+    table = Course.__table__
+    if db.engine.dialect.name == 'mysql':
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            name=stmt.inserted.name,
+            description=stmt.inserted.description,
+            instructor=stmt.inserted.instructor)
+    elif db.engine.dialect.name == 'sqlite':
+        stmt = sqlite.insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.code],
+            set_={'name': stmt.excluded.name,
+                  'description': stmt.excluded.description,
+                  'instructor': stmt.excluded.instructor})
+    else:
+        raise NotImplementedError(f"Course import does not support {db.engine.dialect.name}")
+    # One cached statement, the driver sends the rows as multi-row INSERTs
+    db.session.execute(stmt, values)
+
+
+def _import_course_chunk(chunk, report):
+    valid = {}
+    for line, row in chunk:
+        code = _field(row, 'code')
+        name = _field(row, 'name', 'title')
+        course = dict(code=code, name=name,
+                      description=_field(row, 'description') or '',
+                      instructor=_field(row, 'instructor') or '')
+        if not code or not name:
+            report.error(line, "code and name are required")
+        elif any(len(value) > MAX_FIELD_LENGTH for value in course.values()):
+            report.error(line, f"Fields are limited to {MAX_FIELD_LENGTH} characters")
+        elif code in valid:
+            report.error(line, f"Course {code} already appears on line {valid[code][0]}")
+        else:
+            valid[code] = (line, course)
+
+    # Names are unique too, a name taken by another code would fail the chunk
+    names = {}
+    for code, (_, course) in valid.items():
+        names.setdefault(course["name"], code)
+    existing = db.session.query(Course.code, Course.name, Course.description, Course.instructor)\
+        .filter(or_(Course.code.in_(list(valid)), Course.name.in_(list(names)))).all()
+    by_code = {row.code: row for row in existing}
+    name_owner = {row.name: row.code for row in existing}
+
+    values = []
+    for code, (line, course) in valid.items():
+        if names[course["name"]] != code:
+            report.error(line, f"Course name {course['name']} is used by {names[course['name']]} in this file")
+        elif name_owner.get(course["name"], code) != code:
+            report.error(line, f"Course name {course['name']} belongs to {name_owner[course['name']]}")
+        elif code not in by_code:
+            report.created += 1
+            values.append(course)
+        elif tuple(by_code[code][1:]) == (course["name"], course["description"], course["instructor"]):
+            report.unchanged += 1
+        else:
+            report.updated += 1
+            values.append(course)
+
+    if values:
+        _upsert_courses(values)
+        course_catalog.bump()
+    db.session.commit()
+
+
+def import_courses(lines, fmt):
+    """Create or update courses from ``lines`` of CSV or NDJSON bytes."""
+    report = ImportReport()
+    for chunk in _chunks(read_rows(lines, fmt, report)):
+        _import_course_chunk(chunk, report)
+    return report
+
+
+def _resolve(id_column, key_column, keys, numeric_ids):
+    """Return ``({key: id}, {id})`` for the rows matching ``keys`` or ``numeric_ids``."""
+    if not keys and not numeric_ids:
+        return {}, set()
+    found = db.session.query(id_column, key_column)\
+        .filter(or_(key_column.in_(keys), id_column.in_(numeric_ids))).all()
+    return {row[1]: row[0] for row in found}, {row[0] for row in found}
+
+
+def _import_enrollment_chunk(chunk, report):
+    parsed = []
+    for line, row in chunk:
+        username, user_id = _field(row, 'username'), _field(row, 'userId')
+        code, course_id = _field(row, 'courseCode'), _field(row, 'courseId')
+        if not (username or user_id) or not (code or course_id):
+            report.error(line, "username or userId and courseCode or courseId are required")
+        elif (user_id and not user_id.isdigit()) or (course_id and not course_id.isdigit()):
+            report.error(line, "userId and courseId must be integers")
+        else:
+            parsed.append((line, username, user_id and int(user_id), code, course_id and int(course_id)))
+
+    user_by_name, user_ids = _resolve(User.id, User.username,
+        {row[1] for row in parsed if row[1]}, {row[2] for row in parsed if row[2]})
+    course_by_code, course_ids = _resolve(Course.id, Course.code,
+        {row[3] for row in parsed if row[3]}, {row[4] for row in parsed if row[4]})
+
+    pairs = {}
+    for line, username, user_id, code, course_id in parsed:
+        user_id = user_by_name.get(username) if username else (user_id if user_id in user_ids else None)
+        course_id = course_by_code.get(code) if code else (course_id if course_id in course_ids else None)
+        if user_id is None:
+            report.error(line, f"Unknown user {username or user_id}")
+        elif course_id is None:
+            report.error(line, f"Unknown course {code or course_id}")
+        elif (user_id, course_id) in pairs:
+            report.error(line, f"Enrollment already appears on line {pairs[user_id, course_id]}")
+        else:
+            pairs[user_id, course_id] = line
+
+    if pairs:
+        inserted = db.session.execute(
+            user_courses.insert()
+            .prefix_with('IGNORE', dialect='mysql')
+            .prefix_with('OR IGNORE', dialect='sqlite'),
+            [{"user_id": user_id, "courseId": course_id} for user_id, course_id in pairs]
+        ).rowcount
+        report.created += inserted
+        report.unchanged += len(pairs) - inserted
+
+        # Enrolling changes which posts belong on a home timeline
+        if timeline.enabled():
+            for user_id in {user_id for user_id, _ in pairs}:
+                timeline.rebuild_user(user_id)
+    db.session.commit()
+    auth_context.invalidate(*{user_id for user_id, _ in pairs})
+
+
+def import_enrollments(lines, fmt):
+    """Enroll students from ``lines`` of CSV or NDJSON bytes."""
+    report = ImportReport()
+    for chunk in _chunks(read_rows(lines, fmt, report)):
+        _import_enrollment_chunk(chunk, report)
+    return report
@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    """Process-local LRU cache.
+
+    Entries stored with a ``ttl`` are misses once it has passed. Counters
+    live outside the LRU so that evicting them can never bring a stale
+    generation back.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        # Generations restart from zero with every process
+        self.token = uuid.uuid4().hex[:8]
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters.get(key, 0) + 1
+            self._counters[key] = value
+            return value
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedBackend:
+    """Cache shared between workers through a Redis-compatible client.
+
+    Any object with Redis' ``get``/``set``/``incr`` signatures works, so a
+    local stand-in can replace the real server.
+    """
+
+    def __init__(self, client, prefix='foodle:'):
+        self.client = client
+        self.prefix = prefix
+        self.token = 'shared'
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def __len__(self):
+        return 0
+
+
+class FeedCache:
+    """Cache of serialized course feed pages.
+
+    Pages are keyed by course, page size and cursor under a per-course
+    generation number. Write handlers call ``invalidate_course`` to bump the
+    generation, which orphans every cached page of that course at once.
+    Cached pages are shared between viewers and must not hold per-viewer
+    fields.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = None
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_type = app.config.get('FEED_CACHE_TYPE', 'memory')
+        self.ttl = app.config.get('FEED_CACHE_TTL', 300)
+
+        if cache_type == 'memory':
+            self.backend = MemoryBackend(app.config.get('FEED_CACHE_SIZE', 1024))
+        elif cache_type == 'redis':
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("FEED_CACHE_TYPE 'redis' requires the redis package")
+            self.backend = SharedBackend(redis.Redis.from_url(app.config['FEED_CACHE_REDIS_URL']))
+        elif cache_type == 'null':
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown FEED_CACHE_TYPE: {cache_type}")
+        app.extensions['feed_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def _generation(self, course_id):
+        return self.backend.get(f'feed-gen:{course_id}') or 0
+
+    def _key(self, course_id, limit, cursor):
+        return f'feed:{course_id}:{self._generation(course_id)}:{limit}:{cursor or ""}'
+
+    def get_or_load(self, course_id, limit, cursor, loader):
+        """Return the cached page or build it with ``loader()`` and store it."""
+        if not self.enabled:
+            return loader()
+
+        # Resolve the generation once so a page loaded while the course is
+        # being invalidated is stored under the old, already orphaned key.
+        key = self._key(course_id, limit, cursor)
+        page = self.backend.get(key)
+        if page is not None:
+            self.hits += 1
+            return page
+
+        self.misses += 1
+        page = loader()
+        self.backend.set(key, page, ttl=self.ttl)
+        return page
+
+    def peek(self, course_id, limit, cursor):
+        """The cached page, or None without loading it."""
+        if not self.enabled:
+            return None
+        page = self.backend.get(self._key(course_id, limit, cursor))
+        if page is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return page
+
+    def version(self, course_id):
+        """Token that changes whenever the course's feed is invalidated.
+
+        None when the cache is off, since nothing tracks changes then.
+        """
+        if not self.enabled:
+            return None
+        return f'{self.backend.token}:{self._generation(course_id)}'
+
+    def invalidate_course(self, course_id):
+        if self.enabled and course_id is not None:
+            self.backend.incr(f'feed-gen:{course_id}')
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.backend) if self.enabled else 0
+        }
+
+
+feed_cache = FeedCache()
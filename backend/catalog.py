@@ -0,0 +1,77 @@
+import threading
+from sqlalchemy import func, insert, update
+from models import db, Course, CatalogVersion, user_courses
+from serializers import serialize_course
+
+CATALOG_ROW = 1
+
+
+class CourseCatalog:
+    """Process-local copy of the serialized course list.
+
+    The catalog changes only when a course is created or deleted, and every
+    such write calls ``bump`` in its transaction. Readers compare the copy's
+    version with the one row of ``catalog_version``, a primary key lookup,
+    and reload every course only when another worker or request changed it.
+    The cached dicts are shared and must not be modified.
+    """
+
+    def __init__(self):
+        self._version = None
+        self._courses = []
+        self._by_id = {}
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def version(self):
+        return db.session.query(CatalogVersion.version).filter_by(id=CATALOG_ROW).scalar() or 0
+
+    def bump(self):
+        """Mark the catalog changed, in the caller's transaction."""
+        changed = db.session.execute(
+            update(CatalogVersion)
+            .where(CatalogVersion.id == CATALOG_ROW)
+            .values(version=CatalogVersion.version + 1)
+        ).rowcount
+        if not changed:
+            db.session.execute(insert(CatalogVersion).values(id=CATALOG_ROW, version=1))
+
+    def _load(self):
+        version = self.version()
+        with self._lock:
+            if version == self._version:
+                return version, self._courses, self._by_id
+        # Built outside the lock, concurrent reloads store equal copies
+        courses = [serialize_course(course) for course in Course.query.order_by(Course.id)]
+        by_id = {int(course["id"]): course for course in courses}
+        with self._lock:
+            self._version, self._courses, self._by_id = version, courses, by_id
+            self.reloads += 1
+        return version, courses, by_id
+
+    def all(self):
+        """``(version, courses)`` for the whole catalog, ordered by id."""
+        version, courses, _ = self._load()
+        return version, courses
+
+    def pick(self, course_ids):
+        """``(version, courses)`` for ``course_ids``, in catalog order."""
+        version, _, by_id = self._load()
+        return version, [by_id[course_id] for course_id in sorted(set(course_ids)) if course_id in by_id]
+
+
+def student_counts(course_ids):
+    """Enrollment count of each of ``course_ids``, counted on the courseId index.
+
+    Counts change with every enrollment, so they are never cached with the
+    catalog.
+    """
+    if not course_ids:
+        return {}
+    rows = db.session.query(user_courses.c.courseId, func.count())\
+        .filter(user_courses.c.courseId.in_(course_ids))\
+        .group_by(user_courses.c.courseId)
+    return {course_id: count for course_id, count in rows}
+
+
+course_catalog = CourseCatalog()
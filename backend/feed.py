@@ -0,0 +1,88 @@
+from datetime import datetime
+from sqlalchemy.orm import selectinload
+from models import db, Post, Comment, post_likes
+from pagination import encode_cursor, paginate
+from cache import feed_cache
+from serializers import serialize_post
+
+
+def feed_query(*criteria):
+    """Post query that batch-loads authors, comments and comment authors.
+
+    Each relationship is fetched with one ``IN (...)`` query for the whole
+    page, so serializing a page never touches the database per row.
+    """
+    return Post.query.filter(*criteria).options(
+        selectinload(Post.user),
+        selectinload(Post.comments).selectinload(Comment.user),
+        selectinload(Post.image_upload)
+    )
+
+
+def liked_post_ids(user_id, post_ids):
+    """Return the IDs among ``post_ids`` that ``user_id`` has liked, in one query."""
+    post_ids = [int(post_id) for post_id in post_ids]
+    if not user_id or not post_ids:
+        return set()
+
+    rows = db.session.query(post_likes.c.post_id)\
+        .filter(post_likes.c.user_id == int(user_id))\
+        .filter(post_likes.c.post_id.in_(post_ids))\
+        .all()
+    return {row.post_id for row in rows}
+
+
+def load_feed(query, limit, before=None):
+    """Load one page of ``query``, returns ``(posts, next_cursor)``.
+
+    Pages are shared between viewers, ``with_viewer`` adds the like status.
+    """
+    return paginate(query, Post, limit, before)
+
+
+def with_viewer(posts_data, viewer_id):
+    """Copy serialized posts and overlay the viewer's ``isLiked`` flags."""
+    liked_ids = liked_post_ids(viewer_id, [post["id"] for post in posts_data])
+    return [dict(post, isLiked=int(post["id"]) in liked_ids) for post in posts_data]
+
+
+def course_page(course_id, limit, before=None):
+    """One serialized page of a course feed, served from the feed cache."""
+    def load():
+        posts, next_cursor = load_feed(feed_query(Post.courseId == course_id), limit, before)
+        return {"posts": [serialize_post(post) for post in posts], "nextCursor": next_cursor}
+
+    cursor = encode_cursor(*before) if before else None
+    return feed_cache.get_or_load(int(course_id), limit, cursor, load)
+
+
+def _sort_key(post_data):
+    return datetime.fromisoformat(post_data["createdAt"]), int(post_data["id"])
+
+
+def home_page(course_ids, limit, before=None):
+    """One serialized page of the merged feed of ``course_ids``.
+
+    A first page is merged from the cached first pages of each course when
+    all of them are cached: every post in the merged page is among the
+    first ``limit`` posts of its own course. Later pages and cache misses
+    take a single query over all the courses, so the cost does not grow
+    with the number of enrollments.
+    """
+    pages = None
+    if before is None:
+        pages = [feed_cache.peek(int(course_id), limit, None) for course_id in course_ids]
+    if pages is None or None in pages:
+        posts, next_cursor = load_feed(feed_query(Post.courseId.in_(course_ids)), limit, before)
+        return {"posts": [serialize_post(post) for post in posts], "nextCursor": next_cursor}
+
+    merged = sorted(
+        (post for page in pages for post in page["posts"]),
+        key=_sort_key, reverse=True
+    )
+
+    next_cursor = None
+    if len(merged) > limit or any(page["nextCursor"] for page in pages):
+        merged = merged[:limit]
+        next_cursor = encode_cursor(*_sort_key(merged[-1]))
+    return {"posts": merged, "nextCursor": next_cursor}
@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+
+# Production server profile: gunicorn -c gunicorn.conf.py
+#
+# The app is built once in the master and forked into the workers, so they
+# share its memory and start without importing anything. Each worker then
+# drops the connections it inherited and opens DB_POOL_WARMUP fresh ones
+# before taking requests, so the first requests skip the connection setup.
+#
+# The memory feed cache, the local chat broker and the karma buffer live in
+# each worker, so several workers need FEED_CACHE_TYPE=redis (or null) and
+# CHAT_BROKER=redis, and write karma as it changes unless KARMA_FLUSH_INTERVAL
+# is set. Without them the server runs a single worker.
+#
+# Workers are threaded and chat streams hold a thread each while they are
+# open. CHAT_STREAM_LIMIT defaults to all but 8 threads, further streams get
+# a 503 so the other requests still have threads. The database pool should
+# cover the rest: streams hold no connection, but DB_POOL_SIZE +
+# DB_MAX_OVERFLOW should be at least GUNICORN_THREADS - CHAT_STREAM_LIMIT.
+
+
+def shares_state():
+    """Whether feed pages and chat events are shared between workers."""
+    return (os.getenv('FEED_CACHE_TYPE', 'memory') in ('redis', 'null')
+            and os.getenv('CHAT_BROKER', 'local') == 'redis')
+
+
+wsgi_app = 'app:create_app()'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1 if shares_state() else 1))
+if workers > 1 and not shares_state():
+    raise RuntimeError('WEB_CONCURRENCY above 1 needs FEED_CACHE_TYPE=redis and CHAT_BROKER=redis, '
+                       'each worker would serve its own feed pages and chat events')
+if workers > 1:
+    # Karma buffered in one worker is not seen by the others until it is flushed
+    os.environ.setdefault('KARMA_FLUSH_INTERVAL', '0')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 24))
+if worker_class == 'gthread':
+    os.environ.setdefault('CHAT_STREAM_LIMIT', str(max(threads - 8, 1)))
+preload_app = True
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))  # Seconds before an unresponsive worker is restarted
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))  # Seconds an idle client connection is kept open
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))  # Replace workers now and then, 0 never does
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))  # So they are not all replaced at once
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.getenv('GUNICORN_ERROR_LOG', '-')
+
+
+def warm_up(app):
+    """Give the worker its own pool, with DB_POOL_WARMUP connections open."""
+    from sqlalchemy import text
+    from models import db
+
+    with app.app_context():
+        # Connections opened by the master must not be shared across processes
+        db.engine.dispose(close=False)
+        connections = []
+        try:
+            for _ in range(app.config.get('DB_POOL_WARMUP', 0)):
+                connection = db.engine.connect()
+                connection.execute(text('SELECT 1'))
+                connections.append(connection)
+        finally:
+            # Back into the pool, where they stay open
+            for connection in connections:
+                connection.close()
+
+
+def start_relay(app):
+    """Subscribe the worker to Redis, the relay thread of the master does not survive the fork."""
+    from realtime import chat_hub
+
+    if app.config.get('CHAT_BROKER') == 'redis':
+        chat_hub.init_app(app)
+
+
+def post_fork(server, worker):
+    app = server.app.wsgi()
+    # Independent of the database, a worker without it gets no chat events
+    # published by the others
+    start_relay(app)
+    try:
+        warm_up(app)
+    except Exception:
+        # The pool connects on demand, a worker must still start when the
+        # database is briefly unreachable
+        worker.log.exception('Database pool warm-up failed')
@@ -0,0 +1,167 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from PIL import Image, ImageOps
+from sqlalchemy.exc import IntegrityError
+from models import db, Post, ImageUpload
+from cache import feed_cache
+import storage
+
+# (name, longest edge in pixels)
+VARIANTS = [
+    ('thumb', 320),
+    ('feed', 1080),
+    ('full', 2048),
+]
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ImagePipeline:
+    """Bounded background pool that turns uploads into resized variants.
+
+    Uploads are stored as received and handed to ``IMAGE_WORKERS`` threads.
+    At most ``IMAGE_QUEUE_SIZE`` images may wait on top of the ones being
+    processed; ``submit`` raises ``QueueFull`` beyond that.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        workers = app.config.get('IMAGE_WORKERS', 2)
+        self.format = app.config.get('IMAGE_VARIANT_FORMAT', 'WEBP')
+        self.quality = app.config.get('IMAGE_VARIANT_QUALITY', 80)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image')
+        self._slots = threading.BoundedSemaphore(workers + app.config.get('IMAGE_QUEUE_SIZE', 32))
+        app.extensions['image_pipeline'] = self
+
+    def submit(self, url, path):
+        """Queue the image stored at ``path`` and served at ``url``, return its upload row."""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull()
+
+        try:
+            upload = ImageUpload(url=url, status='processing')
+            db.session.add(upload)
+            db.session.commit()
+        except IntegrityError:
+            # The same file was uploaded concurrently and is queued already
+            db.session.rollback()
+            self._slots.release()
+            return ImageUpload.query.filter_by(url=url).one()
+        except Exception:
+            db.session.rollback()
+            self._slots.release()
+            raise
+
+        try:
+            self._executor.submit(self._run, url, path)
+        except Exception:
+            self._slots.release()
+            raise
+        return upload
+
+    def sweep(self, max_age):
+        """Process again the uploads left ``processing`` for over ``max_age`` seconds.
+
+        Their worker died with its process. Runs in the calling thread and
+        returns the number of uploads swept.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        urls = [row.url for row in db.session.query(ImageUpload.url)
+                .filter(ImageUpload.status == 'processing', ImageUpload.created_at < cutoff)]
+        for url in urls:
+            # A missing original fails like any unreadable image
+            self._finish(url, storage.url_to_path(url))
+        return len(urls)
+
+    def _run(self, url, path):
+        try:
+            with self.app.app_context():
+                self._finish(url, path)
+        finally:
+            self._slots.release()
+
+    def _finish(self, url, path):
+        try:
+            variants = self.process(url, path)
+            status = 'ready'
+        except Exception as e:
+            print(f"Error processing image {url}: {str(e)}")
+            variants, status = None, 'failed'
+
+        ImageUpload.query.filter_by(url=url).update({'status': status, 'variants': variants})
+        db.session.commit()
+
+        # Cached feed pages still point at the original
+        for row in db.session.query(Post.courseId).filter_by(image=url).distinct():
+            feed_cache.invalidate_course(row.courseId)
+
+    def process(self, url, path):
+        """Write the resized variants of an image and return their metadata."""
+        with Image.open(path) as image:
+            # Animated GIFs keep only their original
+            if getattr(image, 'is_animated', False):
+                return {}
+
+            image_format = image.format
+            image = ImageOps.exif_transpose(image)
+
+            stem, original_extension = os.path.splitext(path)
+            url_stem, _ = os.path.splitext(url)
+
+            # The upload is stored under the hash of its bytes and never
+            # rewritten, the upright copy without its metadata is a variant
+            original_path = f"{stem}_original{original_extension}"
+            tmp_path = f"{original_path}.tmp"
+            image.save(tmp_path, image_format, optimize=True, quality=85)
+            os.replace(tmp_path, original_path)
+            variants = {
+                'original': {
+                    "url": f"{url_stem}_original{original_extension}",
+                    "width": image.width,
+                    "height": image.height
+                }
+            }
+
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+            extension = self.format.lower()
+            for name, size in VARIANTS:
+                variant = image.copy()
+                variant.thumbnail((size, size), Image.LANCZOS)
+                # Saving without exif= drops the metadata of the upload
+                variant.save(f"{stem}_{name}.{extension}", self.format, quality=self.quality, method=4)
+                variants[name] = {
+                    "url": f"{url_stem}_{name}.{extension}",
+                    "width": variant.width,
+                    "height": variant.height
+                }
+            return variants
+
+
+def display_url(url, upload):
+    """URL of the upright copy without metadata once it is ready, of the upload as received before."""
+    if upload is not None and upload.status == 'ready' and upload.variants and 'original' in upload.variants:
+        return upload.variants['original']["url"]
+    return url
+
+
+def image_variants(url, upload):
+    """Variant URLs of an image, falling back to the original until they are ready."""
+    if upload is not None and upload.status == 'ready' and upload.variants:
+        return upload.variants
+    return {name: {"url": url, "width": None, "height": None} for name, _ in VARIANTS}
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,127 @@
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from models import db, Chat, Message, ChatReadState, chat_participants
+from pagination import paginate
+
+# Inbox and read state of direct chats.
+#
+# Each participant has one watermark per chat, the id of the last message
+# they have read. Messages after it that someone else sent are unread, so
+# marking a chat read is a single upsert and counting unread messages is a
+# range count over the (chat_id, id, sender_id) index.
+#
+# Chat.last_message_id and Chat.last_activity_at are written together with
+# every message, so the inbox is built from the chats alone.
+
+
+def mark_read(chat_id, user_id, message_id):
+    """Move the user's watermark forward to ``message_id``. Call inside a transaction."""
+    table = ChatReadState.__table__
+    values = dict(chat_id=chat_id, user_id=user_id, last_read_message_id=message_id)
+
+    # Reads reported out of order must not move the watermark back
+    if db.engine.dialect.name == 'mysql':
+        stmt = mysql.insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(last_read_message_id=db.func.greatest(
+            table.c.last_read_message_id, stmt.inserted.last_read_message_id))
+    elif db.engine.dialect.name == 'sqlite':
+        stmt = sqlite.insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.chat_id],
+            set_={'last_read_message_id': db.func.max(
+                table.c.last_read_message_id, stmt.excluded.last_read_message_id)})
+    else:
+        _mark_read_portable(table, values)
+        return
+
+    db.session.execute(stmt)
+
+
+def _mark_read_portable(table, values):
+    """``mark_read`` for databases without an upsert known here."""
+    key = (table.c.chat_id == values['chat_id']) & (table.c.user_id == values['user_id'])
+    message_id = values['last_read_message_id']
+    forward = table.update()\
+        .where(key)\
+        .where(table.c.last_read_message_id < message_id)\
+        .values(last_read_message_id=message_id)
+
+    current = db.session.execute(db.select(table.c.last_read_message_id).where(key)).first()
+    if current is not None:
+        db.session.execute(forward)
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(table.insert().values(**values))
+    except IntegrityError:
+        # A concurrent read created the row first
+        db.session.execute(forward)
+
+
+def unread_counts(user_id, chat_ids=None):
+    """Return ``{chat_id: unread}`` for the user's chats, or only ``chat_ids``, in one query."""
+    watermark = db.func.coalesce(ChatReadState.last_read_message_id, 0)
+    query = db.session.query(chat_participants.c.chat_id, db.func.count(Message.id))\
+        .select_from(chat_participants)\
+        .outerjoin(ChatReadState, db.and_(
+            ChatReadState.user_id == chat_participants.c.user_id,
+            ChatReadState.chat_id == chat_participants.c.chat_id))\
+        .outerjoin(Message, db.and_(
+            Message.chat_id == chat_participants.c.chat_id,
+            Message.id > watermark,
+            Message.sender_id != user_id))\
+        .filter(chat_participants.c.user_id == user_id)\
+        .group_by(chat_participants.c.chat_id)
+    if chat_ids is not None:
+        query = query.filter(chat_participants.c.chat_id.in_(chat_ids))
+    return dict(query.all())
+
+
+def is_participant(chat_id, user_id):
+    return db.session.query(chat_participants.c.chat_id)\
+        .filter_by(chat_id=chat_id, user_id=user_id)\
+        .first() is not None
+
+
+def participating(user_id, chat_ids):
+    """Return the ids among ``chat_ids`` of the chats ``user_id`` takes part in."""
+    rows = db.session.query(chat_participants.c.chat_id)\
+        .filter(chat_participants.c.user_id == user_id)\
+        .filter(chat_participants.c.chat_id.in_(chat_ids))
+    return {chat_id for chat_id, in rows}
+
+
+def chat_channel(chat_id):
+    """Realtime channel of a direct chat, see ``realtime.ChatHub``."""
+    return f'chat:{chat_id}'
+
+
+def record_message(message):
+    """Point the chat at a new message and mark it read for its sender.
+
+    Call after flushing the message, inside the same transaction.
+    """
+    # Concurrent posts may commit out of order, keep the newest message
+    Chat.query\
+        .filter(Chat.id == message.chat_id)\
+        .filter(db.or_(Chat.last_message_id.is_(None), Chat.last_message_id < message.id))\
+        .update({Chat.last_message_id: message.id, Chat.last_activity_at: message.timestamp},
+                synchronize_session=False)
+    mark_read(message.chat_id, message.sender_id, message.id)
+
+
+def load_inbox(user_id, limit, before=None):
+    """Return ``(chats, next_cursor, unread)`` for a page of the user's inbox.
+
+    Chats come most recently active first with their last message and
+    participants loaded; ``unread`` maps chat ids to unread counts. Runs
+    three queries whatever the page size.
+    """
+    query = Chat.query\
+        .join(chat_participants, chat_participants.c.chat_id == Chat.id)\
+        .filter(chat_participants.c.user_id == user_id)\
+        .options(joinedload(Chat.last_message), selectinload(Chat.participants))
+    chats, next_cursor = paginate(query, Chat, limit, before, timestamp=Chat.last_activity_at)
+    unread = unread_counts(user_id, [chat.id for chat in chats]) if chats else {}
+    return chats, next_cursor, unread
@@ -0,0 +1,124 @@
+import atexit
+import os
+import threading
+from collections import defaultdict
+from sqlalchemy import bindparam, func
+from models import db, User
+
+
+class KarmaBuffer:
+    """Write-behind buffer for ``User.karma`` increments.
+
+    Likes add deltas here instead of updating the author's row directly.
+    Pending deltas are written in one batched UPDATE every
+    ``KARMA_FLUSH_INTERVAL`` seconds, as soon as ``KARMA_FLUSH_THRESHOLD``
+    users have pending deltas, and when the process exits. With an interval
+    of 0 every delta is written immediately.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 0
+        self.threshold = 1
+        self._pending = defaultdict(int)
+        # Deltas of the batch being written, counted until it is committed
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._exit_hook = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('KARMA_FLUSH_INTERVAL', 0)
+        self.threshold = app.config.get('KARMA_FLUSH_THRESHOLD', 500)
+        app.extensions['karma_buffer'] = self
+        if not self._exit_hook:
+            atexit.register(self._flush_on_exit)
+            self._exit_hook = True
+
+    def add(self, user_id, delta):
+        if not delta:
+            return
+        with self._lock:
+            self._pending[int(user_id)] += delta
+            size = len(self._pending)
+
+        if not self.interval:
+            self.flush()
+        else:
+            self._ensure_worker()
+            if size >= self.threshold:
+                self._wakeup.set()
+
+    def pending(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            return self._pending.get(user_id, 0) + self._in_flight.get(user_id, 0)
+
+    def current(self, user):
+        """Karma of ``user`` including deltas that are not written yet."""
+        return (user.karma or 0) + self.pending(user.id)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                self._in_flight = {uid: delta for uid, delta in self._pending.items() if delta}
+                self._pending.clear()
+            if not self._in_flight:
+                return 0
+            batch = [{'uid': uid, 'delta': delta} for uid, delta in self._in_flight.items()]
+
+            user = User.__table__
+            stmt = user.update()\
+                .where(user.c.id == bindparam('uid'))\
+                .values(karma=func.coalesce(user.c.karma, 0) + bindparam('delta'))
+            try:
+                db.session.execute(stmt, batch)
+                # Readers see the deltas either in flight or in the rows,
+                # never in both and never in neither
+                with self._lock:
+                    db.session.commit()
+                    self._in_flight = {}
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    for uid, delta in self._in_flight.items():
+                        self._pending[uid] += delta
+                    self._in_flight = {}
+                raise
+            return len(batch)
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so pre-forking servers start one per worker
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='karma-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                print(f"Error flushing karma: {str(e)}")
+
+    def _flush_on_exit(self):
+        if self.app is None:
+            return
+        with self.app.app_context():
+            self.flush()
+
+
+karma_buffer = KarmaBuffer()
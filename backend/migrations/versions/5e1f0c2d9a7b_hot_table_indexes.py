@@ -0,0 +1,70 @@
+"""indexes and primary keys for hot tables
+
+Revision ID: 5e1f0c2d9a7b
+Revises: c4b0aabfa645
+Create Date: 2026-10-18 04:52:10.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1f0c2d9a7b'
+down_revision = 'c4b0aabfa645'
+branch_labels = None
+depends_on = None
+
+
+# (table, [(column, referenced table)], secondary index column)
+ASSOCIATION_TABLES = [
+    ('user_courses', [('user_id', 'user'), ('courseId', 'course')], 'courseId'),
+    ('post_likes', [('user_id', 'user'), ('post_id', 'post')], 'post_id'),
+    ('chat_participants', [('chat_id', 'chat'), ('user_id', 'user')], 'user_id'),
+]
+
+
+def _rebuild(table, columns, primary_key):
+    # Copy the distinct pairs into a fresh table so duplicate rows left behind
+    # by the old keyless tables do not block the new primary key.
+    tmp = f'{table}_rebuild'
+    args = [
+        sa.Column(name, sa.Integer(), sa.ForeignKey(f'{ref}.id'), nullable=not primary_key)
+        for name, ref in columns
+    ]
+    if primary_key:
+        args.append(sa.PrimaryKeyConstraint(*[name for name, _ in columns]))
+    op.create_table(tmp, *args)
+
+    names = [name for name, _ in columns]
+    source = sa.table(table, *[sa.column(name) for name in names])
+    distinct_pairs = sa.select(*source.c)\
+        .where(*[source.c[name].isnot(None) for name in names])\
+        .distinct()
+    target = sa.table(tmp, *[sa.column(name) for name in names])
+    op.execute(target.insert().from_select(names, distinct_pairs))
+
+    op.drop_table(table)
+    op.rename_table(tmp, table)
+
+
+def upgrade():
+    for table, columns, index_column in ASSOCIATION_TABLES:
+        _rebuild(table, columns, primary_key=True)
+        op.create_index(f'ix_{table}_{index_column}', table, [index_column])
+
+    op.create_index('ix_post_course_timestamp', 'post', ['courseId', 'timestamp', 'id'])
+    op.create_index('ix_post_user_timestamp', 'post', ['user_id', 'timestamp', 'id'])
+    op.create_index('ix_comment_post_timestamp', 'comment', ['post_id', 'timestamp'])
+    op.create_index('ix_message_chat_timestamp', 'message', ['chat_id', 'timestamp'])
+
+
+def downgrade():
+    op.drop_index('ix_message_chat_timestamp', table_name='message')
+    op.drop_index('ix_comment_post_timestamp', table_name='comment')
+    op.drop_index('ix_post_user_timestamp', table_name='post')
+    op.drop_index('ix_post_course_timestamp', table_name='post')
+
+    for table, columns, index_column in ASSOCIATION_TABLES:
+        op.drop_index(f'ix_{table}_{index_column}', table_name=table)
+        _rebuild(table, columns, primary_key=False)
@@ -0,0 +1,46 @@
+"""full text search
+
+Revision ID: ab04004d6805
+Revises: ff11e1139c69
+Create Date: 2026-10-18 04:50:23.965774
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'ab04004d6805'
+down_revision = 'ff11e1139c69'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.create_index('ft_comment_content', 'comment', ['content'], unique=False, mysql_prefix='FULLTEXT')
+        op.create_index('ft_post_content', 'post', ['content'], unique=False, mysql_prefix='FULLTEXT')
+    elif dialect == 'sqlite':
+        # Mirrors search.CREATE_SEARCH_INDEX
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index "
+            "USING fts5(content, kind UNINDEXED, course_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "INSERT INTO search_index (rowid, content, kind, course_id) "
+            "SELECT id * 2, content, 'post', courseId FROM post"
+        )
+        op.execute(
+            "INSERT INTO search_index (rowid, content, kind, course_id) "
+            "SELECT comment.id * 2 + 1, comment.content, 'comment', post.courseId "
+            "FROM comment JOIN post ON post.id = comment.post_id"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'mysql':
+        op.drop_index('ft_post_content', table_name='post')
+        op.drop_index('ft_comment_content', table_name='comment')
+    elif dialect == 'sqlite':
+        op.execute('DROP TABLE IF EXISTS search_index')
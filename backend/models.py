@@ -6,15 +6,16 @@ db = SQLAlchemy()
 
 # Association table for user–course many-to-many
 user_courses = db.Table('user_courses',
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('courseId', db.Integer, db.ForeignKey('course.id'))
-
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Column('courseId', db.Integer, db.ForeignKey('course.id'), primary_key=True),
+    db.Index('ix_user_courses_courseId', 'courseId')
 )
 
 # Association table for post likes
 post_likes = db.Table('post_likes',
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('post_id', db.Integer, db.ForeignKey('post.id'))
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Column('post_id', db.Integer, db.ForeignKey('post.id'), primary_key=True),
+    db.Index('ix_post_likes_post_id', 'post_id')
 )
 
 class User(UserMixin, db.Model):
@@ -38,8 +39,22 @@ class Course(db.Model):
     enrolledStudents = db.relationship('User', secondary=user_courses, back_populates='courses')
     posts = db.relationship('Post', backref='course', cascade='all, delete-orphan')
 
+class CatalogVersion(db.Model):
+    # Single row counting changes to the course list, workers compare it
+    # with the version of their cached catalog
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
 
 class Post(db.Model):
+    # Covering indexes for the keyset-paginated course and author feeds
+    __table_args__ = (
+        db.Index('ix_post_course_timestamp', 'courseId', 'timestamp', 'id'),
+        db.Index('ix_post_user_timestamp', 'user_id', 'timestamp', 'id'),
+        # SQLite searches through the FTS5 table in search.py instead
+        db.Index('ft_post_content', 'content', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -48,12 +63,50 @@ class Post(db.Model):
     comments = db.relationship('Comment', backref='post', cascade='all, delete-orphan')
     image = db.Column(db.String(255), nullable=True)
     likes = db.Column(db.Integer, default=0)
+    image_upload = db.relationship('ImageUpload',
+        primaryjoin='foreign(Post.image) == ImageUpload.url',
+        viewonly=True, uselist=False)
 
     def is_liked_by(self, user):
         return user in self.liked_by
 
 
+class StoredBlob(db.Model):
+    # One uploaded file, stored once under its content hash
+    sha256 = db.Column(db.String(64), primary_key=True)
+    url = db.Column(db.String(255), unique=True, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ImageUpload(db.Model):
+    # Resized variants of an uploaded image, filled in by the image pipeline
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(255), unique=True, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='processing')
+    variants = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class TimelineEntry(db.Model):
+    # Materialized home timeline row, written when a post is fanned out
+    __table_args__ = (
+        db.Index('ix_timeline_entry_user_timestamp', 'user_id', 'timestamp', 'post_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id', ondelete='CASCADE'), primary_key=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
+
+
 class Comment(db.Model):
+    __table_args__ = (
+        db.Index('ix_comment_post_timestamp', 'post_id', 'timestamp'),
+        db.Index('ft_comment_content', 'content', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -62,22 +115,83 @@ class Comment(db.Model):
     likes = db.Column(db.Integer, default=0)
 
 class Chat(db.Model):
+    __table_args__ = (
+        db.Index('ix_chat_last_activity', 'last_activity_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Latest message, kept up to date by inbox.record_message so the inbox
+    # does not have to look through the messages of every chat
+    last_message_id = db.Column(db.Integer, db.ForeignKey('message.id', use_alter=True, name='fk_chat_last_message_id', ondelete='SET NULL'))
+    last_activity_at = db.Column(db.DateTime, default=datetime.utcnow)
     participants = db.relationship('User', secondary='chat_participants', backref=db.backref('chats', lazy='dynamic'))
-    messages = db.relationship('Message', backref='chat', cascade='all, delete-orphan')
+    messages = db.relationship('Message', backref='chat', foreign_keys='Message.chat_id', cascade='all, delete-orphan')
+    last_message = db.relationship('Message', foreign_keys=[last_message_id], post_update=True)
 
 # Association table for chat participants
 chat_participants = db.Table('chat_participants',
-    db.Column('chat_id', db.Integer, db.ForeignKey('chat.id')),
-    db.Column('user_id', db.Integer, db.ForeignKey('user.id'))
+    db.Column('chat_id', db.Integer, db.ForeignKey('chat.id'), primary_key=True),
+    db.Column('user_id', db.Integer, db.ForeignKey('user.id'), primary_key=True),
+    db.Index('ix_chat_participants_user_id', 'user_id')
 )
 
 class Message(db.Model):
+    __table_args__ = (
+        db.Index('ix_message_chat_timestamp', 'chat_id', 'timestamp'),
+        # Unread counts are range counts over (chat_id, id) that skip the
+        # reader's own messages without touching the table
+        db.Index('ix_message_chat_id_sender', 'chat_id', 'id', 'sender_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     chat_id = db.Column(db.Integer, db.ForeignKey('chat.id'))
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     sender = db.relationship('User', backref=db.backref('messages', lazy='dynamic'))
-    is_read = db.Column(db.Boolean, default=False)
\ No newline at end of file
+
+class ChatReadState(db.Model):
+    # How far a participant has read a chat, everything after it is unread
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    chat_id = db.Column(db.Integer, db.ForeignKey('chat.id', ondelete='CASCADE'), primary_key=True)
+    last_read_message_id = db.Column(db.Integer, nullable=False, default=0)
+
+class ChatGroup(db.Model):
+    __tablename__ = 'chat_groups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    messages = db.relationship('GroupMessage', backref='group', cascade='all, delete-orphan')
+
+class GroupMessage(db.Model):
+    __tablename__ = 'messages'
+    __table_args__ = (
+        # History pages and incremental fetches walk a group by id,
+        # edits and soft-deletes are found by updated_at
+        db.Index('ix_messages_group_id', 'group_id', 'id'),
+        db.Index('ix_messages_group_updated', 'group_id', 'updated_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(255), nullable=False)
+    message = db.Column(db.Text, nullable=True)
+    group_id = db.Column(db.Integer, db.ForeignKey('chat_groups.id'), nullable=False)
+    file_path = db.Column(db.String(255), nullable=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    is_deleted = db.Column(db.Boolean, nullable=False, default=False)
+
+class ChatUpload(db.Model):
+    # An attachment being uploaded in chunks, its chunks are kept on disk
+    # until the upload is committed as a message
+    __tablename__ = 'chat_uploads'
+
+    id = db.Column(db.String(32), primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey('chat_groups.id', ondelete='CASCADE'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,69 @@
+import base64
+from datetime import datetime
+from flask import request
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidPageArgs(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidPageArgs("Invalid cursor")
+
+
+def get_page_args():
+    """Read ``limit`` and ``before`` from the query string."""
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise InvalidPageArgs("limit must be an integer")
+    if limit < 1:
+        raise InvalidPageArgs("limit must be positive")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    before = request.args.get('before')
+    if before:
+        before = decode_cursor(before)
+    return limit, before
+
+
+def paginate(query, model, limit, before=None, timestamp=None):
+    """Keyset-paginate ``query`` newest first on ``(timestamp, id)``.
+
+    ``timestamp`` is the column to order by, ``model.timestamp`` by default.
+    Returns the rows of the page and the cursor of the next page, or None
+    when there is nothing older left.
+    """
+    if timestamp is None:
+        timestamp = model.timestamp
+
+    if before:
+        before_timestamp, row_id = before
+        query = query.filter(or_(
+            timestamp < before_timestamp,
+            and_(timestamp == before_timestamp, model.id < row_id)
+        ))
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(timestamp.desc(), model.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], timestamp.key), rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """Bounded process pool for password hashing.
+
+    Key derivation is CPU bound and holds the GIL, so run inline it stalls
+    every other request of the worker. Hashes are computed by
+    ``PASSWORD_HASH_WORKERS`` processes instead, with at most
+    ``PASSWORD_HASH_QUEUE_SIZE`` more waiting; ``hash`` and ``verify`` raise
+    ``HasherBusy`` beyond that. With 0 workers they run in the calling
+    thread.
+
+    ``PASSWORD_HASH_METHOD`` is a Werkzeug method, with or without its
+    parameters. ``needs_rehash`` reports hashes stored with other
+    parameters than it currently stands for.
+    """
+
+    def __init__(self, app=None):
+        self.method = 'scrypt:32768:8:1'
+        self.prefix = self.method
+        self.workers = 0
+        self.timeout = None
+        self._executor = None
+        self._pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+        # What the method expands to in a stored hash, 'scrypt' stands for
+        # 'scrypt:32768:8:1' and 'pbkdf2' for the current iteration count
+        self.prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 30)
+        self._slots = threading.BoundedSemaphore(self.workers + app.config.get('PASSWORD_HASH_QUEUE_SIZE', 64))
+        app.extensions['password_hasher'] = self
+
+    def _pool(self):
+        # Started on first use in each process, a pool inherited from a
+        # preloading master has no live workers. Workers are never forked
+        # from the app process: a fork copies locks other threads may be
+        # holding, so they come from a fork server where there is one.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _reset(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        executor = self._pool()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._reset(executor)
+            raise HasherBusy()
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy()
+        except BrokenProcessPool:
+            # A killed worker breaks the whole pool, the next call starts a new one
+            self._reset(executor)
+            raise HasherBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.prefix
+
+
+password_hasher = PasswordHasher()
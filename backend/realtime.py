@@ -0,0 +1,192 @@
+import json
+import queue
+import threading
+from flask import current_app
+
+# Push delivery of chat events.
+#
+# Write handlers publish events on channels such as "group:<id>" after they
+# commit, and the Server-Sent Events endpoint streams the channels a client
+# subscribed to. LocalBroker keeps everything in this process and is enough
+# for a single worker; RedisBroker fans events out between workers.
+
+
+class Subscription:
+    """Events for one connected client, dropped oldest first when it lags."""
+
+    __slots__ = ('channels', '_queue', '_broker')
+
+    def __init__(self, broker, channels, max_pending=100):
+        self.channels = channels
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._broker = broker
+
+    def put(self, payload):
+        while True:
+            try:
+                self._queue.put_nowait(payload)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        """Next payload, or None when nothing arrived within ``timeout`` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process pub/sub hub."""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, payload):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(payload)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels, self.max_pending)
+        with self._lock:
+            for channel in channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({s for subscribers in self._channels.values() for s in subscribers})
+
+
+class RedisBroker(LocalBroker):
+    """Relays events through Redis pub/sub so every worker sees them.
+
+    Each worker keeps one Redis subscription for all its clients and hands
+    the events to its local subscribers, so idle clients cost no Redis
+    connections.
+    """
+
+    def __init__(self, client, max_pending=100, prefix='foodle:'):
+        super().__init__(max_pending)
+        self.client = client
+        self.prefix = prefix
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(f'{prefix}*')
+        self._thread = threading.Thread(target=self._relay, name='chat-relay', daemon=True)
+        self._thread.start()
+
+    def publish(self, channel, payload):
+        self.client.publish(self.prefix + channel, payload)
+
+    def _relay(self):
+        for message in self._pubsub.listen():
+            if message['type'] != 'pmessage':
+                continue
+            channel = message['channel']
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            payload = message['data']
+            if isinstance(payload, bytes):
+                payload = payload.decode()
+            LocalBroker.publish(self, channel[len(self.prefix):], payload)
+
+
+class StreamLimitReached(Exception):
+    pass
+
+
+class ChatHub:
+    def __init__(self, app=None):
+        self.broker = None
+        self.heartbeat = 15
+        self._streams = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        broker_type = app.config.get('CHAT_BROKER', 'local')
+        max_pending = app.config.get('CHAT_STREAM_BACKLOG', 100)
+        self.heartbeat = app.config.get('CHAT_STREAM_HEARTBEAT', 15)
+        # Every open stream holds a server thread
+        limit = app.config.get('CHAT_STREAM_LIMIT', 0)
+        self._streams = threading.BoundedSemaphore(limit) if limit else None
+        if broker_type == 'local':
+            self.broker = LocalBroker(max_pending)
+        elif broker_type == 'redis':
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("CHAT_BROKER 'redis' requires the redis package")
+            self.broker = RedisBroker(redis.Redis.from_url(app.config['CHAT_BROKER_URL']), max_pending)
+        else:
+            raise ValueError(f"Unknown CHAT_BROKER: {broker_type}")
+        app.extensions['chat_hub'] = self
+
+    def publish(self, channel, event, data):
+        """Publish an event, serialized with the app's JSON provider."""
+        if self.broker is None:
+            return
+        payload = json.dumps({'event': event, 'channel': channel, 'data': current_app.json.dumps(data)})
+        self.broker.publish(channel, payload)
+
+    def subscribe(self, channels):
+        return self.broker.subscribe(channels)
+
+    def stream(self, channels):
+        """Stream the events of ``channels``, call ``close_stream`` once the response is closed.
+
+        Raises ``StreamLimitReached`` when CHAT_STREAM_LIMIT streams are
+        already open in this process.
+        """
+        if self._streams is not None and not self._streams.acquire(blocking=False):
+            raise StreamLimitReached()
+        return event_stream(self.broker, channels, self.heartbeat)
+
+    def close_stream(self):
+        if self._streams is not None:
+            self._streams.release()
+
+
+def event_stream(broker, channels, heartbeat):
+    """Format the events of ``channels`` as a Server-Sent Events stream.
+
+    The subscription is made once the stream starts, a client gone before
+    that never holds one.
+    """
+    subscription = broker.subscribe(channels)
+    try:
+        # Tell the client how long to wait before reconnecting
+        yield 'retry: 3000\n\n'
+        while True:
+            payload = subscription.get(timeout=heartbeat)
+            if payload is None:
+                # Comment line, keeps proxies from closing idle connections
+                yield ': keep-alive\n\n'
+                continue
+            message = json.loads(payload)
+            yield f"event: {message['event']}\ndata: {message['data']}\n\n"
+    finally:
+        subscription.close()
+
+
+chat_hub = ChatHub()
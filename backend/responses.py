@@ -0,0 +1,156 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import request, make_response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Conditional GET and compression of API responses.
+#
+# Read endpoints answer If-None-Match with 304 Not Modified. Feed routes
+# build their ETag from the feed cache's course versions before loading
+# anything; the other GET routes of the posts, courses and user blueprints
+# get a hash of the body as ETag through ``conditional_get``. ETags are
+# weak, so the same tag stands for the plain and the compressed body.
+
+COMPRESSIBLE = {'application/json', 'text/html', 'text/plain', 'text/css',
+                'text/javascript', 'application/javascript', 'image/svg+xml'}
+
+# Cached API responses are per user and must be revalidated
+PRIVATE_REVALIDATE = 'private, no-cache'
+
+
+def version_etag(*parts):
+    """ETag for a response fully determined by ``parts``."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+
+def not_modified(etag):
+    """A 304 response when the client already has ``etag``, else None."""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    response_optimizer.record_not_modified(etag)
+    response = make_response('', 304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = PRIVATE_REVALIDATE
+    return response
+
+
+def with_etag(response, etag):
+    """Tag a response built for a version ETag, see ``version_etag``."""
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = PRIVATE_REVALIDATE
+    return response
+
+
+def conditional_get(response):
+    """after_request hook: hash-based ETags and 304s for GET responses."""
+    if request.method != 'GET' or response.status_code != 200 \
+            or response.is_streamed or response.direct_passthrough:
+        return response
+
+    if 'ETag' not in response.headers:
+        response.add_etag(weak=True)
+        response.headers['Cache-Control'] = PRIVATE_REVALIDATE
+    etag, _ = response.get_etag()
+    response_optimizer.remember(etag, response.content_length)
+
+    if request.if_none_match.contains_weak(etag):
+        response_optimizer.record_not_modified(etag)
+        response.make_conditional(request)
+    return response
+
+
+class ResponseOptimizer:
+    """Compresses responses and counts the bytes saved.
+
+    Bodies of at least ``COMPRESS_MIN_SIZE`` bytes are sent with brotli
+    when the client accepts it and the brotli package is installed, gzip
+    otherwise. Bytes saved by 304 responses are estimated from the size of
+    the last body sent under the same ETag.
+    """
+
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        self._sizes = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "compressed": 0,
+            "bytesBeforeCompression": 0,
+            "bytesAfterCompression": 0,
+            "notModified": 0,
+            "notModifiedBytesSaved": 0
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+        self.gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', 6)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 4)
+        if app.config.get('COMPRESS_ENABLED', True):
+            app.after_request(self.compress)
+        app.extensions['response_optimizer'] = self
+
+    def remember(self, etag, size):
+        if not size:
+            return
+        with self._lock:
+            self._sizes[etag] = size
+            self._sizes.move_to_end(etag)
+            while len(self._sizes) > 4096:
+                self._sizes.popitem(last=False)
+
+    def record_not_modified(self, etag):
+        with self._lock:
+            self._stats["notModified"] += 1
+            self._stats["notModifiedBytesSaved"] += self._sizes.get(etag, 0)
+
+    def _encoding(self):
+        offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+        return request.accept_encodings.best_match(offered)
+
+    def compress(self, response):
+        if response.status_code != 200 or response.is_streamed or response.direct_passthrough \
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+        encoding = self._encoding()
+        if encoding is None:
+            return response
+
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        with self._lock:
+            self._stats["compressed"] += 1
+            self._stats["bytesBeforeCompression"] += len(data)
+            self._stats["bytesAfterCompression"] += len(compressed)
+        return response
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["bytesSaved"] = stats["bytesBeforeCompression"] - stats["bytesAfterCompression"] \
+            + stats["notModifiedBytesSaved"]
+        return stats
+
+
+response_optimizer = ResponseOptimizer()
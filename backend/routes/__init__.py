@@ -1,8 +1,14 @@
 from .auth import auth_bp
 from .posts import posts_bp
 from .courses import courses_bp
+from .media import media_bp
+from .chats import chats_bp
+from .admin import admin_bp
 
 def register_blueprints(app):
     app.register_blueprint(auth_bp)
     app.register_blueprint(posts_bp)
-    app.register_blueprint(courses_bp)
\ No newline at end of file
+    app.register_blueprint(courses_bp)
+    app.register_blueprint(media_bp)
+    app.register_blueprint(chats_bp)
+    app.register_blueprint(admin_bp)
\ No newline at end of file
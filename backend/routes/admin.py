@@ -0,0 +1,43 @@
+from functools import wraps
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+import bulk_import
+
+admin_bp = Blueprint('admin', __name__)
+
+CONTENT_TYPES = {'text/csv': 'csv', 'application/x-ndjson': 'ndjson', 'application/jsonl': 'ndjson'}
+
+def admin_required(view):
+    """Allow only the users listed in ADMIN_USER_IDS."""
+    @wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if str(get_jwt_identity()) not in current_app.config.get('ADMIN_USER_IDS', ()):
+            return jsonify({"message": "Admin access required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def import_format():
+    return request.args.get('format') or CONTENT_TYPES.get(request.mimetype)
+
+def run_import(importer):
+    fmt = import_format()
+    if fmt not in bulk_import.FORMATS:
+        return jsonify({"message": "Send text/csv or application/x-ndjson, or pass format=csv|ndjson"}), 415
+
+    # The body is parsed while it is received, one chunk of rows at a time
+    try:
+        report = importer(request.stream, fmt)
+    except UnicodeDecodeError:
+        return jsonify({"message": "The file must be UTF-8"}), 400
+    return jsonify(report.to_dict()), 200
+
+@admin_bp.route('/api/admin/courses/import', methods=['POST'])
+@admin_required
+def import_courses():
+    return run_import(bulk_import.import_courses)
+
+@admin_bp.route('/api/admin/enrollments/import', methods=['POST'])
+@admin_required
+def import_enrollments():
+    return run_import(bulk_import.import_enrollments)
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required
 from models import db, User
-from werkzeug.security import check_password_hash, generate_password_hash
+from karma import karma_buffer
+from passwords import HasherBusy, password_hasher
+from auth_context import auth_context, current_user
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -9,6 +11,24 @@ auth_bp = Blueprint('auth', __name__)
 def index():
     return jsonify(message="Welcome to the auth API")
 
+def busy():
+    response = jsonify({"message": "Too many sign-ins are being processed, try again shortly"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def upgrade_hash(user, password):
+    """Rehash a verified password stored with outdated parameters."""
+    if not password_hasher.needs_rehash(user.password_hash):
+        return
+    try:
+        user.password_hash = password_hasher.hash(password)
+        db.session.commit()
+    except HasherBusy:
+        # Upgraded on a later login
+        pass
+    except Exception:
+        db.session.rollback()
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -21,14 +41,20 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if user and check_password_hash(user.password_hash, password):
+    try:
+        valid = user is not None and password_hasher.verify(user.password_hash, password)
+    except HasherBusy:
+        return busy()
+
+    if valid:
+        upgrade_hash(user, password)
         access_token = create_access_token(identity=str(user.id))
         return jsonify({
             "access_token": access_token,
             "username": user.username,
             "id": user.id,
-            "karma": user.karma,
-            "enrolledCourses": [course.id for course in user.courses]
+            "karma": karma_buffer.current(user),
+            "enrolledCourses": list(auth_context.get(user.id).course_ids)
         }), 200
 
     else:
@@ -52,7 +78,10 @@ def register():
         return jsonify({"message": "User already exists"}), 400
 
     # Hash the password and create a new user
-    hashed_password = generate_password_hash(password)
+    try:
+        hashed_password = password_hasher.hash(password)
+    except HasherBusy:
+        return busy()
     new_user = User(username=username, password_hash=hashed_password)
 
     try:
@@ -70,15 +99,15 @@ def register():
 @auth_bp.route('/api/user', methods=['GET'])
 @jwt_required()  
 def get_user():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = current_user()
     
+    # Karma changes with every like, so it is read from the row
     user_data = {
         "username": user.username,
         "id": user.id,
         "profilePicture": "/placeholder.svg",
-        "enrolledCourses": [course.id for course in user.courses],
-        "karma": user.karma
+        "enrolledCourses": list(user.course_ids),
+        "karma": karma_buffer.current(User.query.get(user.id))
     }
     return jsonify(user_data), 200
 
@@ -1,36 +1,67 @@
-from flask import Flask, request, jsonify, send_from_directory
-import mysql.connector
+from flask import Blueprint, Response, request, jsonify, send_from_directory, current_app
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from models import db, ChatGroup, ChatUpload, GroupMessage
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidPageArgs, decode_cursor, encode_cursor
+from realtime import chat_hub, StreamLimitReached
+from attachments import UPLOAD_FOLDER, upload_folder
+import attachments
+import inbox
+from datetime import datetime, timedelta
 import os
+import re
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import uuid
 
-app = Flask(__name__)
-
-# تكوين MySQL
-db_config = {
-    'host': 'localhost',
-    'user': 'your_username',
-    'password': 'your_password',
-    'database': 'your_database'
-}
+chat_bp = Blueprint('chat', __name__)
 
 # تكوين رفع الملفات
-UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx', 'txt'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+SHA256_PATTERN = re.compile(r'^[0-9a-fA-F]{64}$')
+
+# Attachment names start with a random id, so their content never changes
+ATTACHMENT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
 
-# إنشاء مجلد التحميل إذا لم يكن موجودًا
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Edits committed just before a sync may carry an earlier updated_at, so
+# the next incremental fetch looks back this far and clients dedupe by id
+SYNC_OVERLAP = timedelta(seconds=5)
 
-def get_db_connection():
-    return mysql.connector.connect(**db_config)
+# Groups and direct chats one event stream may follow
+MAX_STREAM_GROUPS = 100
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def serialize_message(msg):
+    # معالجة الرسائل المحذوفة
+    return {
+        'id': msg.id,
+        'sender': msg.sender,
+        'message': 'تم حذف هذه الرسالة' if msg.is_deleted else msg.message,
+        'file_path': None if msg.is_deleted else msg.file_path,
+        'timestamp': msg.timestamp,
+        'updated_at': msg.updated_at,
+        'is_deleted': msg.is_deleted
+    }
+
+def max_file_size():
+    return current_app.config.get('CHAT_MAX_FILE_SIZE', 50 * 1024 * 1024)
+
+def group_channel(group_id):
+    return f'group:{group_id}'
+
+def int_arg(name, default=None, minimum=0):
+    value = request.args.get(name, default)
+    if value is None:
+        return None
+    value = int(value)
+    if value < minimum:
+        raise ValueError(name)
+    return value
+
 # إنشاء مجموعة دردشة جديدة
-@app.route('/groups', methods=['POST'])
+@chat_bp.route('/groups', methods=['POST'])
 def create_group():
     data = request.json
     group_name = data.get('name')
@@ -38,53 +69,137 @@ def create_group():
     if not group_name:
         return jsonify({'error': 'اسم المجموعة مطلوب'}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO chat_groups (name) VALUES (%s)", (group_name,))
-    conn.commit()
-    group_id = cursor.lastrowid
-    cursor.close()
-    conn.close()
+    group = ChatGroup(name=group_name)
+    db.session.add(group)
+    db.session.commit()
 
-    return jsonify({'message': 'تم إنشاء المجموعة', 'group_id': group_id}), 201
+    return jsonify({'message': 'تم إنشاء المجموعة', 'group_id': group.id}), 201
 
-# الحصول على جميع الرسائل لمجموعة معينة
-@app.route('/chat/<int:group_id>', methods=['GET'])
+# الحصول على رسائل مجموعة معينة
+#
+# ?since_id=<id>&since=<syncedAt>  messages newer than since_id, plus older
+#                                  ones edited or deleted after since
+# &updated_after=<updatedCursor>   the next page of those edits, sent with
+#                                  the same since until updatedCursor is null
+# ?before_id=<id>                  the page of history before before_id
+# neither                          the latest page
+@chat_bp.route('/chat/<int:group_id>', methods=['GET'])
 def get_group_messages(group_id):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT m.id, m.sender, m.message, m.file_path, m.timestamp, m.is_deleted
-        FROM messages m
-        WHERE m.group_id = %s
-        ORDER BY m.timestamp ASC
-    """, (group_id,))
-    messages = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    # معالجة الرسائل المحذوفة
-    processed_messages = []
-    for msg in messages:
-        if msg['is_deleted']:
-            msg['message'] = 'تم حذف هذه الرسالة'
-            msg['file_path'] = None
-        processed_messages.append(msg)
-    
-    return jsonify(processed_messages)
+    try:
+        limit = min(int_arg('limit', DEFAULT_PAGE_SIZE, minimum=1), MAX_PAGE_SIZE)
+        since_id = int_arg('since_id')
+        before_id = int_arg('before_id')
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else None
+        updated_after = request.args.get('updated_after')
+        updated_after = decode_cursor(updated_after) if updated_after else None
+    except (ValueError, InvalidPageArgs):
+        return jsonify({'error': 'Invalid pagination parameters'}), 400
+
+    synced_at = datetime.utcnow() - SYNC_OVERLAP
+    messages = GroupMessage.query.filter(GroupMessage.group_id == group_id)
+
+    if since_id is not None:
+        newer = messages\
+            .filter(GroupMessage.id > since_id)\
+            .order_by(GroupMessage.id.asc())\
+            .limit(limit + 1)\
+            .all()
+        updated = []
+        if since is not None:
+            # Oldest edit first on (updated_at, id), the order of the index
+            edits = messages\
+                .filter(GroupMessage.id <= since_id)\
+                .filter(GroupMessage.updated_at > since)
+            if updated_after is not None:
+                updated_at, message_id = updated_after
+                edits = edits.filter(db.or_(
+                    GroupMessage.updated_at > updated_at,
+                    db.and_(GroupMessage.updated_at == updated_at, GroupMessage.id > message_id)))
+            updated = edits\
+                .order_by(GroupMessage.updated_at.asc(), GroupMessage.id.asc())\
+                .limit(limit + 1)\
+                .all()
+        last_edit = updated[limit - 1] if len(updated) > limit else None
+
+        return jsonify({
+            'messages': [serialize_message(msg) for msg in newer[:limit]],
+            'updated': [serialize_message(msg) for msg in updated[:limit]],
+            'hasMore': len(newer) > limit,
+            'updatedCursor': encode_cursor(last_edit.updated_at, last_edit.id) if last_edit else None,
+            'syncedAt': synced_at.isoformat()
+        })
+
+    if before_id is not None:
+        messages = messages.filter(GroupMessage.id < before_id)
+    page = messages.order_by(GroupMessage.id.desc()).limit(limit + 1).all()
+
+    # Pages are fetched newest first but returned oldest first
+    return jsonify({
+        'messages': [serialize_message(msg) for msg in reversed(page[:limit])],
+        'hasMore': len(page) > limit,
+        'syncedAt': synced_at.isoformat()
+    })
+
+# بث الرسائل الجديدة والمعدلة والمحذوفة لحظيًا (Server-Sent Events)
+#
+# ?groups=1,2,3  events of these groups, as message.created, message.updated
+#                and message.deleted with the serialized message as data.
+# ?chats=4,5     message.created of these direct chats, serialized as by
+#                /api/chats. Needs a JWT of a participant of each of them.
+# After a reconnect clients catch up with ?since_id on GET /chat/<group_id>
+# and with GET /api/chats/<chat_id>/messages.
+@chat_bp.route('/chat/stream', methods=['GET'])
+def stream_group_messages():
+    try:
+        group_ids = {int(group_id) for group_id in request.args.get('groups', '').split(',') if group_id}
+        chat_ids = {int(chat_id) for chat_id in request.args.get('chats', '').split(',') if chat_id}
+    except ValueError:
+        return jsonify({'error': 'معرفات المجموعات غير صالحة'}), 400
+    if not (group_ids or chat_ids) or len(group_ids) + len(chat_ids) > MAX_STREAM_GROUPS:
+        return jsonify({'error': 'معرفات المجموعات غير صالحة'}), 400
+
+    if chat_ids:
+        # Raises the usual 401 without a valid token
+        verify_jwt_in_request()
+        if inbox.participating(int(get_jwt_identity()), chat_ids) != chat_ids:
+            return jsonify({'error': 'المحادثة غير موجودة'}), 404
+
+    # The stream outlives the request, so it must not keep a pooled connection
+    db.session.remove()
+
+    channels = [group_channel(group_id) for group_id in group_ids]
+    channels += [inbox.chat_channel(chat_id) for chat_id in chat_ids]
+    try:
+        events = chat_hub.stream(channels)
+    except StreamLimitReached:
+        return jsonify({'error': 'عدد الاتصالات المفتوحة كبير، حاول لاحقًا'}), 503
+
+    response = Response(events, mimetype='text/event-stream')
+    response.call_on_close(chat_hub.close_stream)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 # إرسال رسالة إلى مجموعة (نص أو ملف)
-@app.route('/chat/<int:group_id>', methods=['POST'])
+@chat_bp.route('/chat/<int:group_id>', methods=['POST'])
 def post_group_message(group_id):
     # التحقق من وجود المجموعة
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM chat_groups WHERE id = %s", (group_id,))
-    if not cursor.fetchone():
-        cursor.close()
-        conn.close()
+    if not db.session.query(ChatGroup.id).filter_by(id=group_id).first():
         return jsonify({'error': 'المجموعة غير موجودة'}), 404
 
+    # رفض الطلبات الأكبر من الحد قبل قراءة الملف
+    if request.content_length and request.content_length > max_file_size():
+        return jsonify({'error': 'حجم الملف أكبر من المسموح'}), 413
+
+    # A chunked body has no Content-Length, the parser stops at the limit
+    request.max_content_length = max_file_size()
+    try:
+        request.files
+    except RequestEntityTooLarge:
+        return jsonify({'error': 'حجم الملف أكبر من المسموح'}), 413
+
     # معالجة رفع الملف
     file_path = None
     if 'file' in request.files:
@@ -92,45 +207,160 @@ def post_group_message(group_id):
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
             unique_filename = f"{uuid.uuid4()}_{filename}"
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(file_path)
-    
+            file.save(os.path.join(upload_folder(), unique_filename))
+            file_path = os.path.join(current_app.config.get('CHAT_UPLOAD_FOLDER', UPLOAD_FOLDER), unique_filename)
+
     # الحصول على بيانات الرسالة
     sender = request.form.get('sender')
     message = request.form.get('message')
 
     if not sender or (not message and not file_path):
         if file_path:  # تنظيف الملف إذا فشل التحقق
-            os.remove(file_path)
-        cursor.close()
-        conn.close()
+            os.remove(os.path.join(current_app.root_path, file_path))
         return jsonify({'error': 'المرسل والمحتوى (نص أو ملف) مطلوبان'}), 400
 
     # حفظ الرسالة في قاعدة البيانات
-    cursor.execute(
-        """INSERT INTO messages 
-        (sender, message, group_id, file_path, is_deleted) 
-        VALUES (%s, %s, %s, %s, %s)""",
-        (sender, message, group_id, file_path, False)
-    )
-    conn.commit()
-    message_id = cursor.lastrowid
-    cursor.close()
-    conn.close()
+    msg = GroupMessage(sender=sender, message=message, group_id=group_id, file_path=file_path, is_deleted=False)
+    db.session.add(msg)
+    db.session.commit()
+    chat_hub.publish(group_channel(group_id), 'message.created', serialize_message(msg))
 
     return jsonify({
         'message': 'تم إرسال الرسالة إلى المجموعة',
-        'message_id': message_id,
+        'message_id': msg.id,
         'file_path': file_path
     }), 201
 
+# بدء رفع ملف على أجزاء
+#
+# POST /chat/<group_id>/uploads             {filename, size, sha256} starts an upload
+# GET  /chat/uploads/<id>                   the chunks received so far, to resume
+# PUT  /chat/uploads/<id>/chunks/<index>    raw bytes of one chunk, retried as needed
+# POST /chat/uploads/<id>/commit            {sender, message} sends it as a message
+# DELETE /chat/uploads/<id>                 abandons it
+@chat_bp.route('/chat/<int:group_id>/uploads', methods=['POST'])
+def create_upload(group_id):
+    if not db.session.query(ChatGroup.id).filter_by(id=group_id).first():
+        return jsonify({'error': 'المجموعة غير موجودة'}), 404
+
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    sha256 = data.get('sha256') or ''
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'حجم الملف مطلوب'}), 400
+
+    if not allowed_file(filename):
+        return jsonify({'error': 'نوع الملف غير مسموح'}), 400
+    if not SHA256_PATTERN.match(sha256):
+        return jsonify({'error': 'المجموع الاختباري SHA-256 مطلوب'}), 400
+    if size < 1:
+        return jsonify({'error': 'حجم الملف مطلوب'}), 400
+    if size > max_file_size():
+        return jsonify({'error': 'حجم الملف أكبر من المسموح'}), 413
+
+    upload = attachments.create(group_id, filename, size, sha256)
+    return jsonify(serialize_upload(upload, [])), 201
+
+def serialize_upload(upload, received):
+    return {
+        'upload_id': upload.id,
+        'size': upload.size,
+        'chunk_size': upload.chunk_size,
+        'chunks': attachments.chunk_count(upload),
+        'received': received
+    }
+
+# حالة الرفع لاستئنافه بعد الانقطاع
+@chat_bp.route('/chat/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    upload = ChatUpload.query.get(upload_id)
+    if not upload:
+        return jsonify({'error': 'عملية الرفع غير موجودة'}), 404
+
+    return jsonify(serialize_upload(upload, attachments.received_chunks(upload)))
+
+# رفع جزء من الملف
+@chat_bp.route('/chat/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    upload = ChatUpload.query.get(upload_id)
+    if not upload:
+        return jsonify({'error': 'عملية الرفع غير موجودة'}), 404
+    # Nothing else needs the database while the chunk streams in
+    db.session.remove()
+
+    try:
+        attachments.write_chunk(upload, index, request.stream)
+    except attachments.InvalidChunk as e:
+        return jsonify({'error': str(e)}), 400
+
+    return '', 204
+
+# إنهاء الرفع وإرسال الملف كرسالة
+@chat_bp.route('/chat/uploads/<upload_id>/commit', methods=['POST'])
+def commit_upload(upload_id):
+    upload = ChatUpload.query.get(upload_id)
+    if not upload:
+        return jsonify({'error': 'عملية الرفع غير موجودة'}), 404
+
+    data = request.get_json(silent=True) or {}
+    sender = data.get('sender')
+    if not sender:
+        return jsonify({'error': 'المرسل مطلوب'}), 400
+
+    unique_filename = f"{upload.id}_{secure_filename(upload.filename) or 'file'}"
+    try:
+        attachments.assemble(upload, os.path.join(upload_folder(), unique_filename))
+    except attachments.IncompleteUpload as e:
+        return jsonify({'error': 'لم تكتمل أجزاء الملف', 'missing': e.args[0]}), 409
+    except attachments.ChecksumMismatch:
+        # The bad chunk cannot be told apart, the client starts over
+        ChatUpload.query.filter_by(id=upload.id).delete()
+        db.session.commit()
+        attachments.discard(upload.id)
+        return jsonify({'error': 'المجموع الاختباري غير مطابق'}), 422
+
+    # Only one of concurrent commits of the same upload creates a message
+    if not ChatUpload.query.filter_by(id=upload.id).delete():
+        db.session.rollback()
+        return jsonify({'error': 'تم إرسال هذا الملف بالفعل'}), 409
+
+    file_path = os.path.join(current_app.config.get('CHAT_UPLOAD_FOLDER', UPLOAD_FOLDER), unique_filename)
+    msg = GroupMessage(sender=sender, message=data.get('message'), group_id=upload.group_id,
+                       file_path=file_path, is_deleted=False)
+    db.session.add(msg)
+    db.session.commit()
+    attachments.discard(upload.id)
+    chat_hub.publish(group_channel(upload.group_id), 'message.created', serialize_message(msg))
+
+    return jsonify({
+        'message': 'تم إرسال الرسالة إلى المجموعة',
+        'message_id': msg.id,
+        'file_path': file_path
+    }), 201
+
+# إلغاء الرفع
+@chat_bp.route('/chat/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    if not ChatUpload.query.filter_by(id=upload_id).delete():
+        return jsonify({'error': 'عملية الرفع غير موجودة'}), 404
+    db.session.commit()
+    attachments.discard(upload_id)
+    return '', 204
+
 # تنزيل ملف مرفق
-@app.route('/download/<filename>', methods=['GET'])
+#
+# Supports Range requests so large documents can be read partially, and
+# ETag/If-Modified-Since revalidation
+@chat_bp.route('/download/<filename>', methods=['GET', 'HEAD'])
 def download_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    response = send_from_directory(upload_folder(), filename, conditional=True, etag=True, max_age=None)
+    response.headers['Cache-Control'] = ATTACHMENT_CACHE_CONTROL
+    return response
 
 # تعديل رسالة
-@app.route('/chat/message/<int:message_id>', methods=['PUT'])
+@chat_bp.route('/chat/message/<int:message_id>', methods=['PUT'])
 def update_message(message_id):
     data = request.json
     new_message = data.get('message')
@@ -138,61 +368,40 @@ def update_message(message_id):
     if not new_message:
         return jsonify({'error': 'المحتوى الجديد مطلوب'}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # التحقق من وجود الرسالة
-    cursor.execute("SELECT id FROM messages WHERE id = %s AND is_deleted = %s", 
-                  (message_id, False))
-    if not cursor.fetchone():
-        cursor.close()
-        conn.close()
+    # التحقق من وجود الرسالة وتحديثها
+    updated = GroupMessage.query\
+        .filter_by(id=message_id, is_deleted=False)\
+        .update({GroupMessage.message: new_message})
+    db.session.commit()
+
+    if not updated:
         return jsonify({'error': 'الرسالة غير موجودة أو محذوفة'}), 404
-    
-    # تحديث الرسالة
-    cursor.execute(
-        "UPDATE messages SET message = %s WHERE id = %s",
-        (new_message, message_id)
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
+
+    msg = GroupMessage.query.get(message_id)
+    chat_hub.publish(group_channel(msg.group_id), 'message.updated', serialize_message(msg))
 
     return jsonify({'message': 'تم تحديث الرسالة بنجاح'})
 
 # حذف رسالة
-@app.route('/chat/message/<int:message_id>', methods=['DELETE'])
+@chat_bp.route('/chat/message/<int:message_id>', methods=['DELETE'])
 def delete_message(message_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     # التحقق من وجود الرسالة
-    cursor.execute("SELECT id, file_path FROM messages WHERE id = %s", (message_id,))
-    message = cursor.fetchone()
-    
-    if not message:
-        cursor.close()
-        conn.close()
+    msg = GroupMessage.query.get(message_id)
+
+    if not msg:
         return jsonify({'error': 'الرسالة غير موجودة'}), 404
-    
+
     # حذف الرسالة (حذف ناعم)
-    cursor.execute(
-        "UPDATE messages SET is_deleted = %s WHERE id = %s",
-        (True, message_id)
-    )
-    conn.commit()
-    
+    file_path = msg.file_path
+    msg.is_deleted = True
+    db.session.commit()
+    chat_hub.publish(group_channel(msg.group_id), 'message.deleted', serialize_message(msg))
+
     # حذف الملف المرفق إذا وجد
-    if message[1]:
+    if file_path:
         try:
-            os.remove(message[1])
+            os.remove(os.path.join(current_app.root_path, file_path))
         except OSError:
             pass
-    
-    cursor.close()
-    conn.close()
 
     return jsonify({'message': 'تم حذف الرسالة بنجاح'})
-
-if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,188 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import db, User, Chat, Message, chat_participants
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidPageArgs, get_page_args
+from serializers import serialize_user
+from realtime import chat_hub
+import inbox
+
+chats_bp = Blueprint('chats', __name__)
+
+PREVIEW_LENGTH = 100
+
+def serialize_message(message, preview=False):
+    content = message.content
+    if preview and len(content) > PREVIEW_LENGTH:
+        content = content[:PREVIEW_LENGTH] + "…"
+    return {
+        "id": str(message.id),
+        "content": content,
+        "senderId": str(message.sender_id),
+        "timestamp": message.timestamp.isoformat()
+    }
+
+def serialize_chat(chat, user_id, unread=0):
+    others = [user for user in chat.participants if user.id != user_id]
+    return {
+        "id": str(chat.id),
+        # The other side of a direct chat
+        "participant": serialize_user(others[0]) if others else None,
+        "participants": [serialize_user(user) for user in chat.participants],
+        "lastMessage": serialize_message(chat.last_message, preview=True) if chat.last_message else None,
+        "lastActivityAt": chat.last_activity_at.isoformat() if chat.last_activity_at else None,
+        "unreadCount": unread
+    }
+
+@chats_bp.route('/api/chats', methods=['GET'])
+@jwt_required()
+def get_chats():
+    user_id = int(get_jwt_identity())
+    try:
+        limit, before = get_page_args()
+    except InvalidPageArgs as e:
+        return jsonify({"message": str(e)}), 400
+
+    chats, next_cursor, unread = inbox.load_inbox(user_id, limit, before)
+
+    return jsonify({
+        "chats": [serialize_chat(chat, user_id, unread.get(chat.id, 0)) for chat in chats],
+        "nextCursor": next_cursor
+    }), 200
+
+@chats_bp.route('/api/chats', methods=['POST'])
+@jwt_required()
+def create_chat():
+    user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+    try:
+        participant_id = int(data.get('participantId'))
+    except (TypeError, ValueError):
+        return jsonify({"message": "participantId is required"}), 400
+    if participant_id == user_id:
+        return jsonify({"message": "Cannot start a chat with yourself"}), 400
+
+    participant = User.query.get(participant_id)
+    if not participant:
+        return jsonify({"message": "User not found"}), 404
+
+    # Reuse the existing direct chat between the two users
+    mine = db.session.query(chat_participants.c.chat_id)\
+        .filter(chat_participants.c.user_id == user_id)
+    chat = Chat.query\
+        .filter(Chat.id.in_(mine))\
+        .filter(Chat.participants.any(User.id == participant_id))\
+        .first()
+    created = chat is None
+
+    try:
+        if created:
+            chat = Chat(participants=[User.query.get(user_id), participant])
+            db.session.add(chat)
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 500
+
+    unread = inbox.unread_counts(user_id, [chat.id]).get(chat.id, 0)
+    return jsonify(serialize_chat(chat, user_id, unread)), 201 if created else 200
+
+@chats_bp.route('/api/chats/<int:chat_id>/messages', methods=['GET'])
+@jwt_required()
+def get_chat_messages(chat_id):
+    user_id = int(get_jwt_identity())
+    if not inbox.is_participant(chat_id, user_id):
+        return jsonify({"message": "Chat not found"}), 404
+
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        before_id = request.args.get('before_id')
+        before_id = int(before_id) if before_id else None
+        if limit < 1:
+            raise ValueError()
+    except ValueError:
+        return jsonify({"message": "Invalid pagination parameters"}), 400
+
+    query = Message.query.filter(Message.chat_id == chat_id)
+    if before_id is not None:
+        query = query.filter(Message.id < before_id)
+    page = query.order_by(Message.id.desc()).limit(limit + 1).all()
+
+    # Pages are fetched newest first but returned oldest first
+    return jsonify({
+        "messages": [serialize_message(message) for message in reversed(page[:limit])],
+        "hasMore": len(page) > limit
+    }), 200
+
+@chats_bp.route('/api/chats/<int:chat_id>/messages', methods=['POST'])
+@jwt_required()
+def send_chat_message(chat_id):
+    user_id = int(get_jwt_identity())
+    if not inbox.is_participant(chat_id, user_id):
+        return jsonify({"message": "Chat not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    content = (data.get('content') or '').strip()
+    if not content:
+        return jsonify({"message": "Content is required"}), 400
+
+    try:
+        message = Message(content=content, chat_id=chat_id, sender_id=user_id)
+        db.session.add(message)
+        db.session.flush()
+        inbox.record_message(message)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 500
+
+    chat_hub.publish(inbox.chat_channel(chat_id), 'message.created', serialize_message(message))
+    return jsonify(serialize_message(message)), 201
+
+@chats_bp.route('/api/chats/unread', methods=['GET'])
+@jwt_required()
+def get_unread_counts():
+    user_id = int(get_jwt_identity())
+    counts = inbox.unread_counts(user_id)
+
+    return jsonify({
+        "chats": [
+            {"chatId": str(chat_id), "unreadCount": unread}
+            for chat_id, unread in counts.items()
+        ],
+        "total": sum(counts.values())
+    }), 200
+
+@chats_bp.route('/api/chats/<int:chat_id>/read', methods=['POST'])
+@jwt_required()
+def mark_chat_read(chat_id):
+    user_id = int(get_jwt_identity())
+    if not inbox.is_participant(chat_id, user_id):
+        return jsonify({"message": "Chat not found"}), 404
+
+    # Without a messageId everything posted so far is read
+    data = request.get_json(silent=True) or {}
+    message_id = data.get('messageId')
+    latest = db.session.query(db.func.max(Message.id)).filter_by(chat_id=chat_id).scalar() or 0
+    try:
+        message_id = latest if message_id is None else int(message_id)
+    except (TypeError, ValueError):
+        return jsonify({"message": "Invalid messageId"}), 400
+
+    # The watermark never moves back, so an id past the newest message
+    # would hide every message still to come
+    message_chat_id = db.session.query(Message.chat_id).filter_by(id=message_id).scalar()
+    if message_chat_id is not None and message_chat_id != chat_id:
+        return jsonify({"message": "Message is not in this chat"}), 400
+    message_id = min(message_id, latest)
+
+    try:
+        inbox.mark_read(chat_id, user_id, message_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 500
+
+    return jsonify({
+        "chatId": str(chat_id),
+        "unreadCount": inbox.unread_counts(user_id, [chat_id]).get(chat_id, 0)
+    }), 200
@@ -1,8 +1,18 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Course, Post
+from flask_jwt_extended import jwt_required
+from models import db, User, Course, Post, user_courses
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from cache import feed_cache
+import timeline
+import search
+import storage
+from catalog import course_catalog, student_counts
+from auth_context import auth_context, current_user
+from serializers import serialize_course, stream_json
+from responses import conditional_get, not_modified, version_etag, with_etag
 
 courses_bp = Blueprint('courses', __name__)
+courses_bp.after_request(conditional_get)
 
 @courses_bp.route('/api/courses', methods=['POST'])
 def create_course():
@@ -22,18 +32,12 @@ def create_course():
         )
 
         db.session.add(new_course)
+        course_catalog.bump()
         db.session.commit()
 
         return jsonify({
             "message": "Course created successfully",
-            "course": {
-                "id": new_course.id,
-                "userId": new_course.userId,
-                "code": new_course.code,
-                "name": new_course.name,
-                "description": new_course.description,
-                "instructor": new_course.instructor
-            }
+            "course": serialize_course(new_course, 0)
         }), 201
 
     except Exception as e:
@@ -47,8 +51,18 @@ def delete_course(courseId):
         return jsonify({"message": "Course not found"}), 404
     
     try:
+        course_id = course.id
+        images = [post.image for post in course.posts]
+        timeline.remove_posts(Post.courseId == course_id)
+        search.remove_posts(Post.courseId == course_id)
+        storage.release(images)
         db.session.delete(course)
+        course_catalog.bump()
         db.session.commit()
+        feed_cache.invalidate_course(course_id)
+        # Every cached student of the course lists it
+        auth_context.clear()
+        storage.collect(images)
         return jsonify({"message": "Course deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
@@ -58,94 +72,80 @@ def delete_course(courseId):
 @courses_bp.route('/api/courses/all', methods=['GET'])
 @jwt_required()  # Protect route with JWT
 def get_courses():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-
-    if not user:
+    if current_user() is None:
         return jsonify({"message": "User not found"}), 404
 
-    courses = Course.query.all()
-
-    courses_list = [{
-        "id": course.id,
-        "code": "CS101", # TODO: change to course.code
-        "name": course.name, # TODO: change to course.name
-        "description": "Fundamental concepts of computer science and programming", # TODO: change to course.description
-        "instructor": "Prof. Anderson", # TODO: change to course.instructor
-        "enrolledStudents": [] # TODO: change to course.enrolledStudents
-    } for course in courses]
+    version, courses = course_catalog.all()
+    etag = version_etag('catalog', version)
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
 
-    return jsonify({"courses": courses_list}), 200
+    # The whole catalog, encoded while it is sent
+    return with_etag(stream_json("courses", courses, lambda course: course), etag)
 
 @courses_bp.route('/api/courses/my', methods=['GET'])
 @jwt_required()
 def get_my_courses():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = current_user()
 
     if not user:
         return jsonify({"message": "User not found"}), 404
 
-    courses = user.courses
+    course_ids = user.course_ids
+    counts = student_counts(course_ids)
+    version, courses = course_catalog.pick(course_ids)
+    etag = version_etag('my-courses', version, sorted(counts.items()))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
 
-    courses_list = [{
-        "id": course.id,
-        "code": "CS101", # TODO: change to course.code
-        "name": course.name, # TODO: change to course.name
-        "description": "Fundamental concepts of computer science and programming", # TODO: change to course.description
-        "instructor": "Prof. Anderson", # TODO: change to course.instructor
-        "enrolledStudents": [] # TODO: change to course.enrolledStudents
-    } for course in courses]
+    courses = [dict(course, studentCount=counts.get(int(course["id"]), 0)) for course in courses]
+    return with_etag(jsonify({"courses": courses}), etag), 200
 
-    return jsonify({"courses": courses_list}), 200
-
-@courses_bp.route('/api/courses/<courseId>/posts', methods=['GET'])
+@courses_bp.route('/api/courses/<courseId>/info', methods=['GET'])
 @jwt_required()
-def get_course_posts(courseId):
-    # Verify course exists
+def get_course_info(courseId):
     course = Course.query.get(courseId)
     if not course:
         return jsonify({"message": "Course not found"}), 404
 
-    # Get all posts for the course
-    posts = Post.query.filter_by(courseId=courseId).order_by(Post.timestamp.desc()).all()
-
-    posts_list = [{
-        "id": post.id,
-        "userId": post.user_id,
-        "courseId": post.courseId,
-        "content": post.content,
-        "image": "/placeholder.svg", # TODO: change to post.image_url
-        "karma": post.upvotes - post.downvotes, # TODO: change to post.likes
-        "createdAt": post.timestamp, # TODO: change to post.created_at
-        "comments": [{
-            "id": comment.id,
-            "userId": comment.user_id,
-            "postId": comment.courseId,
-            "content": comment.content,
-            "createdAt": "2024-01-01" # TODO: change to comment.created_at  
-        } for comment in post.comments]
-    } for post in posts]
-
-    return jsonify({"posts": posts_list}), 200
+    # The roster itself is paged by /api/courses/<courseId>/students
+    is_enrolled = auth_context.is_enrolled(current_user(), course.id)
+    course_data = serialize_course(course, student_counts([course.id]).get(course.id, 0))
+    course_data["isEnrolled"] = is_enrolled
 
-@courses_bp.route('/api/courses/<courseId>/info', methods=['GET'])
+    return jsonify({"course": course_data}), 200
+
+@courses_bp.route('/api/courses/<courseId>/students', methods=['GET'])
 @jwt_required()
-def get_course_info(courseId):
-    course = Course.query.get(courseId)
-    if not course:
+def get_course_students(courseId):
+    course_id = db.session.query(Course.id).filter_by(id=courseId).scalar()
+    if course_id is None:
         return jsonify({"message": "Course not found"}), 404
-    
-    course_data = {
-        "id": course.id,
-        "code": course.code,
-        "name": course.name,
-        "description": course.description,
-        "instructor": course.instructor,
-        "enrolledStudents": [student.id for student in course.enrolledStudents]
-    }
 
-    return jsonify({"course": course_data}), 200
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        after = request.args.get('after')
+        after = int(after) if after else None
+        if limit < 1:
+            raise ValueError()
+    except ValueError:
+        return jsonify({"message": "Invalid pagination parameters"}), 400
+
+    # Walks the (courseId, user_id) index in user id order
+    query = db.session.query(User.id, User.username)\
+        .join(user_courses, user_courses.c.user_id == User.id)\
+        .filter(user_courses.c.courseId == course_id)
+    if after is not None:
+        query = query.filter(user_courses.c.user_id > after)
+    rows = query.order_by(user_courses.c.user_id).limit(limit + 1).all()
+
+    students = [{"id": str(row.id), "username": row.username} for row in rows[:limit]]
+    return jsonify({
+        "students": students,
+        "nextCursor": students[-1]["id"] if len(rows) > limit else None
+    }), 200
 
 @courses_bp.route('/api/enroll', methods=['POST'])
 @jwt_required()  # Protect route with JWT
@@ -162,19 +162,19 @@ def enroll():
     if not course:
         return jsonify({"message": "Course not found"}), 404
 
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = current_user()
 
     if not user:
         return jsonify({"message": "User not found"}), 404
 
-    if course in user.courses:
+    if auth_context.is_enrolled(user, course.id):
         return jsonify({"message": "Already enrolled in this course"}), 400
 
-    user.courses.append(course)
-
     try:
+        db.session.execute(user_courses.insert().values(user_id=user.id, courseId=course.id))
+        timeline.backfill([user.id], course.id)
         db.session.commit()
+        auth_context.invalidate(user.id)
         return jsonify({"message": f"Successfully enrolled in {course.name}"}), 200
     except Exception as e:
         db.session.rollback()  # Rollback in case of error
@@ -196,29 +196,24 @@ def unenroll():
     if not course:
         return jsonify({"message": "Course not found"}), 404
 
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = current_user()
 
     if not user:
         return jsonify({"message": "User not found"}), 404
 
-    if course not in user.courses:
-        return jsonify({"message": "Not enrolled in this course"}), 400
-
-    user.courses.remove(course)
-
     try:
+        removed = db.session.execute(user_courses.delete()
+            .where(user_courses.c.user_id == user.id)
+            .where(user_courses.c.courseId == course.id)).rowcount
+        if not removed:
+            db.session.rollback()
+            return jsonify({"message": "Not enrolled in this course"}), 400
+        timeline.prune(user.id, course.id)
         db.session.commit()
+        auth_context.invalidate(user.id)
         return jsonify({
             "message": f"Successfully unenrolled from {course.name}",
-            "course": {
-                "id": course.id,
-                "code": course.code,
-                "name": course.name,
-                "description": course.description,
-                "instructor": course.instructor,
-                "enrolledStudents": [student.id for student in course.enrolledStudents]
-            }
+            "course": serialize_course(course, student_counts([course.id]).get(course.id, 0))
         }), 200
     except Exception as e:
         db.session.rollback()  # Rollback in case of error
@@ -0,0 +1,31 @@
+import os
+from flask import Blueprint, current_app, make_response, send_from_directory, abort
+from werkzeug.security import safe_join
+from storage import upload_root
+
+media_bp = Blueprint('media', __name__)
+
+# Uploads are named after their content or a random id and never rewritten
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+@media_bp.route('/static/uploads/<path:filename>', methods=['GET', 'HEAD'])
+def uploaded_file(filename):
+    root = upload_root()
+    path = safe_join(root, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    # Let the front proxy read the file from disk, it handles ranges and
+    # conditional requests itself
+    if current_app.config.get('MEDIA_SENDFILE') == 'x-accel':
+        response = make_response('')
+        response.headers['X-Accel-Redirect'] = current_app.config.get('MEDIA_ACCEL_PREFIX', '/_uploads/') + filename
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.headers.pop('Content-Type', None)
+        return response
+
+    # send_file honours USE_X_SENDFILE, which the 'x-sendfile' mode turns on
+    response = send_from_directory(root, filename, conditional=True, etag=True, max_age=None)
+    response.headers['Cache-Control'] = IMMUTABLE
+    return response
@@ -1,12 +1,22 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Course, Post, Comment
-import os
-from werkzeug.utils import secure_filename
-from PIL import Image
-import uuid
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from models import db, Course, Post, Comment, ImageUpload, post_likes
+from sqlalchemy import func
+from karma import karma_buffer
+from pagination import InvalidPageArgs, get_page_args
+from feed import course_page, feed_query, home_page, load_feed, with_viewer
+from cache import feed_cache
+from auth_context import auth_context, current_user
+import timeline
+import search
+from images import QueueFull, image_pipeline, image_variants
+from serializers import serialize_comment, serialize_post, stream_json
+from responses import conditional_get, not_modified, response_optimizer, version_etag, with_etag
+import storage
+from routes.admin import admin_required
 
 posts_bp = Blueprint('posts', __name__)
+posts_bp.after_request(conditional_get)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB
@@ -29,24 +39,32 @@ def upload_image():
     
     if file.content_length and file.content_length > MAX_IMAGE_SIZE:
         return jsonify({"message": "File size too large"}), 400
-    
+
     try:
-        # Create uploads directory if it doesn't exist
-        upload_dir = os.path.join(current_app.root_path, 'static', 'uploads')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generate unique filename
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        filepath = os.path.join(upload_dir, unique_filename)
-        
-        # Save and optimize image
-        image = Image.open(file)
-        image.save(filepath, optimize=True, quality=85)
-        
+        # Store each distinct file once, keyed by the hash of its bytes
+        blob, path, created = storage.save_image(file.stream, MAX_IMAGE_SIZE)
+    except storage.UploadTooLarge:
+        return jsonify({"message": "File size too large"}), 400
+    except storage.InvalidImage:
+        return jsonify({"message": "File is not a valid image"}), 400
+
+    try:
+        # Resize new images in the background
+        upload = ImageUpload.query.filter_by(url=blob.url).first()
+        if upload is None:
+            try:
+                upload = image_pipeline.submit(blob.url, path)
+            except QueueFull:
+                # Unless another upload of the same file came in meanwhile
+                if created:
+                    storage.delete_blob(blob.sha256, uploaded_at=blob.last_uploaded_at)
+                return jsonify({"message": "Too many images are being processed, try again shortly"}), 503
+
         # Return the URL path to the image
-        image_url = f"/static/uploads/{unique_filename}"
-        return jsonify({"imageUrl": image_url}), 200
+        return jsonify({
+            "imageUrl": blob.url,
+            "imageVariants": image_variants(blob.url, upload)
+        }), 200
         
     except Exception as e:
         return jsonify({"message": str(e)}), 500
@@ -54,8 +72,7 @@ def upload_image():
 @posts_bp.route('/api/post', methods=['POST', 'DELETE'])
 @jwt_required() 
 def post():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id) 
+    user = current_user()
     if request.method == 'POST':
         data = request.get_json()
 
@@ -73,7 +90,7 @@ def post():
             return jsonify({"message": "Course not found"}), 404
 
         # Check if user is enrolled in the course
-        if course not in user.courses:
+        if not auth_context.is_enrolled(user, course.id):
             return jsonify({"message": "You must be enrolled in the course to post"}), 403
 
         # Create new post
@@ -86,24 +103,17 @@ def post():
 
         try:
             db.session.add(post)
+            db.session.flush()
+            if not storage.acquire(post.image):
+                db.session.rollback()
+                return jsonify({"message": "Image no longer exists, upload it again"}), 400
+            timeline.fan_out(post)
+            search.index_post(post)
             db.session.commit()
-            post_data = {
-                "id": str(post.id),
-                "content": post.content,
-                "createdAt": post.timestamp.isoformat(),
-                "userId": str(post.user_id),
-                "courseId": str(post.courseId),
-                "likes": 0,
-                "comments": []
-            }
-            
-            # Only add image field if it exists
-            if post.image:
-                post_data["image"] = post.image
-
+            feed_cache.invalidate_course(post.courseId)
             return jsonify({
                 "message": "Post created successfully",
-                "post": post_data
+                "post": serialize_post(post)
             }), 201
         except Exception as e:
             db.session.rollback()
@@ -128,8 +138,15 @@ def post():
             return jsonify({"message": "Unauthorized to delete this post"}), 403
 
         try:
+            course_id = post.courseId
+            image = post.image
+            timeline.remove_posts(Post.id == post.id)
+            search.remove_posts(Post.id == post.id)
+            storage.release([image])
             db.session.delete(post)
             db.session.commit()
+            feed_cache.invalidate_course(course_id)
+            storage.collect([image])
             return jsonify({"message": "Post deleted successfully"}), 200
         except Exception as e:
             db.session.rollback()
@@ -138,43 +155,34 @@ def post():
 @posts_bp.route('/api/post/home', methods=['GET'])
 @jwt_required() 
 def home_posts():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id) 
+    user = current_user()
     try:
-        # Get all posts from courses the user is enrolled in
-        posts = Post.query\
-            .filter(Post.courseId.in_([c.id for c in user.courses]))\
-            .order_by(Post.timestamp.desc())\
-            .all()
-
-        posts_data = [{
-            "id": str(post.id),
-            "content": post.content,
-            "createdAt": post.timestamp.isoformat(),
-            "userId": str(post.user_id),
-            "courseId": str(post.courseId),
-            "username": post.user.username,
-            "likes": post.likes or 0,
-            "isLiked": user in post.liked_by,  # Check if current user liked the post
-            "comments": [{
-                "id": str(comment.id),
-                "content": comment.content,
-                "createdAt": comment.timestamp.isoformat(),
-                "userId": str(comment.user_id),
-                "postId": str(post.id),
-                "username": comment.user.username
-            } for comment in post.comments]
-        } for post in posts]
-
-        # Add image field only if it exists
-        for i, post in enumerate(posts):
-            if post.image:
-                posts_data[i]["image"] = post.image
+        limit, before = get_page_args()
+    except InvalidPageArgs as e:
+        return jsonify({"message": str(e)}), 400
 
-        return jsonify({
+    try:
+        # Get one page of posts from courses the user is enrolled in,
+        # from the precomputed timeline when that mode is on
+        course_ids = list(user.course_ids)
+
+        # Unchanged since the client's copy when none of the courses changed
+        versions = [feed_cache.version(course_id) for course_id in course_ids]
+        etag = version_etag('home', user.id, course_ids, versions, limit, before) \
+            if None not in versions else None
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        page = timeline.home_page(user.id, course_ids, limit, before) if timeline.enabled() else None
+        if page is None:
+            page = home_page(course_ids, limit, before)
+
+        return with_etag(jsonify({
             "message": "Posts retrieved successfully",
-            "posts": posts_data
-        }), 200
+            "posts": with_viewer(page["posts"], user.id),
+            "nextCursor": page["nextCursor"]
+        }), etag), 200
 
     except Exception as e:
         print(f"Error in home_posts: {str(e)}")  # Add logging for debugging
@@ -183,34 +191,23 @@ def home_posts():
 @posts_bp.route('/api/post/my', methods=['GET'])
 @jwt_required() 
 def my_posts():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id) 
+    user_id = current_user().id
     try:
-        # Get all posts where user is the author
-        posts = Post.query\
-            .filter(Post.user_id == user_id)\
-            .order_by(Post.timestamp.desc())\
-            .all()
+        limit, before = get_page_args()
+    except InvalidPageArgs as e:
+        return jsonify({"message": str(e)}), 400
 
-        posts_data = [{
-            "id": post.id,
-            "content": post.content,
-            "timestamp": post.timestamp,
-            "user_id": post.user_id,
-            "courseId": post.courseId,
-            "username": post.user.username,
-            "comments": [{
-                "id": comment.id,
-                "content": comment.content,
-                "timestamp": comment.timestamp,
-                "user_id": comment.user_id,
-                "username": comment.user.username
-            } for comment in post.comments]
-        } for post in posts]
+    try:
+        # Get one page of posts where user is the author
+        posts, next_cursor = load_feed(
+            feed_query(Post.user_id == user_id),
+            limit, before
+        )
 
         return jsonify({
             "message": "Posts retrieved successfully",
-            "posts": posts_data
+            "posts": [serialize_post(post) for post in posts],
+            "nextCursor": next_cursor
         }), 200
 
     except Exception as e:
@@ -219,39 +216,24 @@ def my_posts():
 @posts_bp.route('/api/post/all', methods=['GET'])
 @jwt_required() 
 def all_posts():
-    print("all posts")
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id) 
+    user = current_user()
     try:
-        # Get all courses for current user
-        user_courses = user.courses
+        limit, before = get_page_args()
+    except InvalidPageArgs as e:
+        return jsonify({"message": str(e)}), 400
 
-        # Query posts for all user's courses
-        posts = Post.query\
-            .filter(Post.courseId.in_([c.id for c in user_courses]))\
-            .order_by(Post.timestamp.desc())\
-            .all()
+    try:
+        # Query one page of posts for all user's courses
+        posts, next_cursor = load_feed(
+            feed_query(Post.courseId.in_(user.course_ids)),
+            limit, before
+        )
 
         # Format posts for response
-        posts_data = [{
-            "id": post.id,
-            "content": post.content,
-            "timestamp": post.timestamp,
-            "user_id": post.user_id,
-            "courseId": post.courseId,
-            "username": post.user.username,
-            "comments": [{
-                "id": comment.id,
-                "content": comment.content,
-                "timestamp": comment.timestamp,
-                "user_id": comment.user_id,
-                "username": comment.user.username
-            } for comment in post.comments]
-        } for post in posts]
-
         return jsonify({
             "message": "Posts retrieved successfully",
-            "posts": posts_data
+            "posts": [serialize_post(post) for post in posts],
+            "nextCursor": next_cursor
         }), 200
 
     except Exception as e:
@@ -260,8 +242,7 @@ def all_posts():
 @posts_bp.route('/api/comment', methods=['POST'])
 @jwt_required() 
 def create_comment():
-    user_id = get_jwt_identity() 
-    user = User.query.get(user_id)
+    user = current_user()
 
     data = request.get_json()
 
@@ -286,18 +267,13 @@ def create_comment():
 
     try:
         db.session.add(comment)
+        db.session.flush()
+        search.index_comment(comment, post.courseId)
         db.session.commit()
+        feed_cache.invalidate_course(post.courseId)
         return jsonify({
             "message": "Comment created successfully",
-            "comment": {
-                "id": str(comment.id),
-                "content": comment.content,
-                "createdAt": comment.timestamp.isoformat(),
-                "userId": str(comment.user_id),
-                "postId": str(comment.post_id),
-                "username": user.username,  # Include username for display
-                "likes": 0
-            }
+            "comment": serialize_comment(comment)
         }), 201
     except Exception as e:
         db.session.rollback()
@@ -306,8 +282,7 @@ def create_comment():
 @posts_bp.route('/api/comment', methods=['DELETE'])
 @jwt_required()
 def delete_comment():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = current_user()
     data = request.get_json()
     comment_id = data.get('commentId')
     if not comment_id:
@@ -318,8 +293,11 @@ def delete_comment():
     if comment.user_id != user.id:
         return jsonify({"message": "Unauthorized to delete this comment"}), 403
     try:
+        course_id = comment.post.courseId
+        search.remove_comments(Comment.id == comment.id)
         db.session.delete(comment)
         db.session.commit()
+        feed_cache.invalidate_course(course_id)
         return jsonify({"message": "Comment deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
@@ -328,74 +306,126 @@ def delete_comment():
 @posts_bp.route('/api/courses/<courseId>/posts', methods=['GET'])
 @jwt_required()
 def get_course_posts(courseId):
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = current_user()
     
     # Verify course exists
     course = Course.query.get(courseId)
     if not course:
         return jsonify({"message": "Course not found"}), 404
 
-    # Get all posts for the course
-    posts = Post.query.filter_by(courseId=courseId).order_by(Post.timestamp.desc()).all()
-
-    posts_list = [{
-        "id": str(post.id),
-        "userId": str(post.user_id),
-        "courseId": str(post.courseId),
-        "content": post.content,
-        "likes": post.likes or 0,
-        "isLiked": user in post.liked_by,  # Check if current user liked the post
-        "createdAt": post.timestamp.isoformat(),
-        "comments": [{
-            "id": str(comment.id),
-            "userId": str(comment.user_id),
-            "postId": str(post.id),
-            "content": comment.content,
-            "createdAt": comment.timestamp.isoformat()
-        } for comment in post.comments]
-    } for post in posts]
-
-    # Add image field only if it exists
-    for i, post in enumerate(posts):
-        if post.image:
-            posts_list[i]["image"] = post.image
-
-    return jsonify({"posts": posts_list}), 200
+    try:
+        limit, before = get_page_args()
+    except InvalidPageArgs as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Likes by the viewer invalidate the course too, so the version covers
+    # isLiked as well
+    version = feed_cache.version(course.id)
+    etag = version_etag('course', course.id, version, user.id, limit, before) if version else None
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    # Get one page of posts for the course, shared by every student in it
+    page = course_page(course.id, limit, before)
+
+    return with_etag(jsonify({
+        "posts": with_viewer(page["posts"], user.id),
+        "nextCursor": page["nextCursor"]
+    }), etag), 200
+
+@posts_bp.route('/api/search', methods=['GET'])
+@jwt_required()
+def search_posts():
+    user = current_user()
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"message": "Search query is required"}), 400
+
+    try:
+        limit, _ = get_page_args()
+        offset = int(request.args.get('offset', 0))
+        if offset < 0:
+            raise InvalidPageArgs("offset must not be negative")
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Only the courses the user is enrolled in, optionally narrowed to one
+    course_ids = list(user.course_ids)
+    if request.args.get('courseId'):
+        course_ids = [course_id for course_id in course_ids if str(course_id) == request.args['courseId']]
+
+    hits, has_more = search.search(query, course_ids, limit, offset)
+
+    return jsonify({
+        "results": search.load_results(hits),
+        "nextOffset": offset + limit if has_more else None
+    }), 200
+
+@posts_bp.route('/api/feed-cache/stats', methods=['GET'])
+@admin_required
+def feed_cache_stats():
+    return jsonify(feed_cache.stats()), 200
+
+@posts_bp.route('/api/response-stats', methods=['GET'])
+@admin_required
+def response_stats():
+    return jsonify(response_optimizer.stats()), 200
+
+def toggle_like(user_id, post_id):
+    """Like or unlike a post and return the change in its like count.
+
+    The unlike is a single DELETE and the like an INSERT that ignores an
+    existing row, so concurrent requests never double count. The counters
+    are then moved in the database by however many rows actually changed.
+    """
+    deleted = db.session.execute(
+        post_likes.delete()
+        .where(post_likes.c.user_id == user_id)
+        .where(post_likes.c.post_id == post_id)
+    ).rowcount
+    if deleted:
+        delta = -1
+    else:
+        delta = db.session.execute(
+            post_likes.insert()
+            .prefix_with('IGNORE', dialect='mysql')
+            .prefix_with('OR IGNORE', dialect='sqlite')
+            .values(user_id=user_id, post_id=post_id)
+        ).rowcount
+
+    if delta:
+        Post.query.filter_by(id=post_id).update(
+            {Post.likes: func.coalesce(Post.likes, 0) + delta},
+            synchronize_session=False
+        )
+    return delta
 
 @posts_bp.route('/api/post/<int:post_id>/like', methods=['POST'])
 @jwt_required()
 def like_post(post_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user_id = current_user().id
 
-    # Find the post
-    post = Post.query.get(post_id)
+    # Find the post author
+    post = db.session.query(Post.user_id, Post.courseId).filter_by(id=post_id).first()
     if not post:
         return jsonify({"message": "Post not found"}), 404
 
     try:
-        # Check if user already liked the post
-        if post.is_liked_by(user):
-            # Unlike the post
-            post.liked_by.remove(user)
-            post.likes = post.likes - 1
-            post.user.karma = post.user.karma - 1
-            action = "unliked"
-        else:
-            # Like the post
-            post.liked_by.append(user)
-            post.likes = post.likes + 1
-            post.user.karma = post.user.karma + 1
-            action = "liked"
-
+        delta = toggle_like(user_id, post_id)
         db.session.commit()
+        karma_buffer.add(post.user_id, delta)
+        if delta:
+            feed_cache.invalidate_course(post.courseId)
+
+        action = "unliked" if delta < 0 else "liked"
+        likes = db.session.query(Post.likes).filter_by(id=post_id).scalar()
         return jsonify({
             "message": f"Post {action} successfully",
             "post": {
-                "id": str(post.id),
-                "likes": post.likes,
-                "isLiked": post.is_liked_by(user)
+                "id": str(post_id),
+                "likes": likes or 0,
+                "isLiked": delta >= 0
             }
         }), 200
     except Exception as e:
@@ -407,14 +437,14 @@ def like_post(post_id):
 @posts_bp.route('/api/posts/liked', methods=['GET'])
 @jwt_required()
 def get_liked_posts():
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = current_user()
     
     try:
-        liked_post_ids = [str(post.id) for post in user.liked_posts]
-        return jsonify({
-            "liked_posts": liked_post_ids
-        }), 200
+        # Only the IDs are needed, no post rows
+        liked = db.session.query(post_likes.c.post_id)\
+            .filter(post_likes.c.user_id == user.id)\
+            .all()
+        return stream_json("liked_posts", liked, lambda row: str(row.post_id))
     except Exception as e:
         print(f"Error in get_liked_posts: {str(e)}")
         return jsonify({"message": str(e)}), 500
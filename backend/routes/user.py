@@ -1,9 +1,18 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, Post, Course, user_courses
+from models import db, User, Post
+from karma import karma_buffer
+from cache import feed_cache
+from catalog import course_catalog
+from auth_context import auth_context, current_user
+from serializers import serialize_post, serialize_user
+from responses import conditional_get
+from pagination import InvalidPageArgs, get_page_args
+from feed import feed_query, load_feed
 from datetime import datetime
 
 user_bp = Blueprint('user', __name__)
+user_bp.after_request(conditional_get)
 
 @user_bp.route('/api/users/me', methods=['GET'])
 @jwt_required()
@@ -14,12 +23,7 @@ def get_current_user():
     if not user:
         return jsonify({'message': 'User not found'}), 404
     
-    return jsonify({
-        'id': str(user.id),
-        'username': user.username,
-        'profilePicture': "placeholder.svg",
-        'karma': user.karma
-    }), 200
+    return jsonify(serialize_user(user, karma_buffer.current(user))), 200
 
 @user_bp.route('/api/users/<user_id>', methods=['GET'])
 @jwt_required()
@@ -29,12 +33,7 @@ def get_user(user_id):
     if not user:
         return jsonify({'message': 'User not found'}), 404
     
-    return jsonify({
-        'id': str(user.id),
-        'username': user.username,
-        'profilePicture': "placeholder.svg",
-        'karma': user.karma
-    }), 200
+    return jsonify(serialize_user(user, karma_buffer.current(user))), 200
 
 @user_bp.route('/api/users/<user_id>/posts', methods=['GET'])
 @jwt_required()
@@ -44,46 +43,26 @@ def get_user_posts(user_id):
     if not user:
         return jsonify({'message': 'User not found'}), 404
     
-    posts = Post.query.filter_by(user_id=user_id).order_by(Post.timestamp.desc()).all()
-    
-    posts_data = [{
-        'id': str(post.id),
-        'content': post.content,
-        'timestamp': post.timestamp.isoformat(),
-        'userId': str(post.user_id),
-        'courseId': str(post.courseId) if post.courseId else None,
-        'image': post.image,
-        'likes': post.likes,
-        'comments': [{
-            'id': str(comment.id),
-            'content': comment.content,
-            'timestamp': comment.timestamp.isoformat(),
-            'userId': str(comment.user_id),
-            'likes': comment.likes
-        } for comment in post.comments]
-    } for post in posts]
-    
-    return jsonify({'posts': posts_data}), 200
+    try:
+        limit, before = get_page_args()
+    except InvalidPageArgs as e:
+        return jsonify({'message': str(e)}), 400
+
+    posts, next_cursor = load_feed(feed_query(Post.user_id == user_id), limit, before)
+    
+    return jsonify({'posts': [serialize_post(post) for post in posts], 'nextCursor': next_cursor}), 200
 
-@user_bp.route('/api/users/<user_id>/courses', methods=['GET'])
+@user_bp.route('/api/users/<int:user_id>/courses', methods=['GET'])
 @jwt_required()
 def get_user_courses(user_id):
-    user = User.query.get(user_id)
+    user = auth_context.get(user_id)
     
     if not user:
         return jsonify({'message': 'User not found'}), 404
     
-    courses = Course.query.join(user_courses).filter(user_courses.c.user_id == user_id).all()
-    
-    courses_data = [{
-        'id': str(course.id),
-        'name': course.name,
-        'code': course.code,
-        'description': course.description,
-        'instructor': course.instructor
-    } for course in courses]
+    _, courses = course_catalog.pick(user.course_ids)
     
-    return jsonify({'courses': courses_data}), 200
+    return jsonify({'courses': courses}), 200
 
 @user_bp.route('/api/users/<user_id>/karma', methods=['GET'])
 @jwt_required()
@@ -93,14 +72,14 @@ def get_user_karma(user_id):
     if not user:
         return jsonify({'message': 'User not found'}), 404
     
-    return jsonify({'karma': user.karma}), 200
+    return jsonify({'karma': karma_buffer.current(user)}), 200
 
 @user_bp.route('/api/users/<user_id>/profile', methods=['PUT'])
 @jwt_required()
 def update_user_profile(user_id):
-    current_user_id = get_jwt_identity()
+    caller = current_user()
     
-    if str(current_user_id) != user_id:
+    if caller is None or str(caller.id) != user_id:
         return jsonify({'message': 'Unauthorized'}), 403
     
     user = User.query.get(user_id)
@@ -121,14 +100,14 @@ def update_user_profile(user_id):
     
     try:
         db.session.commit()
+        auth_context.invalidate(user.id)
+        if 'username' in data:
+            # Cached course feeds embed author usernames
+            for course_id in caller.course_ids:
+                feed_cache.invalidate_course(course_id)
         return jsonify({
             'message': 'Profile updated successfully',
-            'user': {
-                'id': str(user.id),
-                'username': user.username,
-                'profilePicture': "placeholder.svg",
-                'karma': user.karma
-            }
+            'user': serialize_user(user, karma_buffer.current(user))
         }), 200
     except Exception as e:
         db.session.rollback()
@@ -0,0 +1,130 @@
+import re
+from sqlalchemy import column, event, literal, literal_column, select, table
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import joinedload
+from models import db, Post, Comment
+from serializers import serialize_comment, serialize_post
+
+# Full-text search over posts and comments.
+#
+# On MySQL, post.content and comment.content carry FULLTEXT indexes that
+# InnoDB updates on every insert and delete. SQLite, used for local runs and
+# tests, has no such index type, so an FTS5 table (search_index) stands in
+# for them and the write handlers keep it current through index_post,
+# index_comment, remove_posts and remove_comments, which do nothing on
+# MySQL. FTS5 rows are keyed by rowid = 2 * id for posts and 2 * id + 1 for
+# comments.
+
+WORD = re.compile(r'\w+')
+
+search_index = table('search_index',
+    column('rowid'), column('content'), column('kind'), column('course_id'))
+
+CREATE_SEARCH_INDEX = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index "
+    "USING fts5(content, kind UNINDEXED, course_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(CREATE_SEARCH_INDEX)
+
+
+def _uses_fts():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def index_post(post):
+    """Add a flushed post to the index, in the caller's transaction."""
+    if _uses_fts():
+        db.session.execute(search_index.insert().values(
+            rowid=post.id * 2, content=post.content, kind='post', course_id=post.courseId))
+
+
+def index_comment(comment, course_id):
+    """Add a flushed comment on a post of ``course_id`` to the index."""
+    if _uses_fts():
+        db.session.execute(search_index.insert().values(
+            rowid=comment.id * 2 + 1, content=comment.content, kind='comment', course_id=course_id))
+
+
+def remove_posts(*criteria):
+    """Drop the posts matching ``criteria`` and their comments. Call before deleting them."""
+    if _uses_fts():
+        rowids = select(Post.id * 2).where(*criteria).union_all(
+            select(Comment.id * 2 + 1).join(Post, Comment.post_id == Post.id).where(*criteria))
+        db.session.execute(search_index.delete().where(search_index.c.rowid.in_(rowids)))
+
+
+def remove_comments(*criteria):
+    if _uses_fts():
+        rowids = select(Comment.id * 2 + 1).where(*criteria)
+        db.session.execute(search_index.delete().where(search_index.c.rowid.in_(rowids)))
+
+
+def _fts_hits(words, course_ids):
+    # Quoting every word keeps FTS5 query syntax out of user input
+    terms = ' OR '.join(f'"{word}"' for word in words)
+    score = literal_column('bm25(search_index)')
+    return select(search_index.c.kind, search_index.c.rowid.label('id'), score.label('score'))\
+        .where(literal_column('search_index').op('MATCH')(terms))\
+        .where(search_index.c.course_id.in_(course_ids))\
+        .order_by(score, search_index.c.rowid.desc())
+
+
+def _fulltext_hits(words, course_ids):
+    terms = ' '.join(words)
+    post_score = mysql.match(Post.content, against=terms).in_natural_language_mode()
+    comment_score = mysql.match(Comment.content, against=terms).in_natural_language_mode()
+    posts = select(literal('post').label('kind'), Post.id.label('id'), post_score.label('score'))\
+        .where(post_score)\
+        .where(Post.courseId.in_(course_ids))
+    comments = select(literal('comment').label('kind'), Comment.id.label('id'), comment_score.label('score'))\
+        .join(Post, Comment.post_id == Post.id)\
+        .where(comment_score)\
+        .where(Post.courseId.in_(course_ids))
+    hits = posts.union_all(comments).subquery()
+    return select(hits.c.kind, hits.c.id, hits.c.score)\
+        .order_by(hits.c.score.desc(), hits.c.id.desc())
+
+
+def search(query, course_ids, limit, offset=0):
+    """Rank the posts and comments of ``course_ids`` that match ``query``.
+
+    Returns ``(hits, has_more)`` where hits are ``(kind, id)`` pairs, best
+    match first.
+    """
+    words = WORD.findall(query.lower())
+    if not words or not course_ids:
+        return [], False
+
+    if _uses_fts():
+        rows = db.session.execute(_fts_hits(words, course_ids).limit(limit + 1).offset(offset)).all()
+        hits = [(row.kind, row.id // 2) for row in rows[:limit]]
+    else:
+        rows = db.session.execute(_fulltext_hits(words, course_ids).limit(limit + 1).offset(offset)).all()
+        hits = [(row.kind, row.id) for row in rows[:limit]]
+    return hits, len(rows) > limit
+
+
+def load_results(hits):
+    """Serialize search hits, loading them and their authors in two queries."""
+    post_ids = [row_id for kind, row_id in hits if kind == 'post']
+    comment_ids = [row_id for kind, row_id in hits if kind == 'comment']
+    posts = {post.id: post for post in Post.query.options(joinedload(Post.user), joinedload(Post.image_upload))
+             .filter(Post.id.in_(post_ids))} if post_ids else {}
+    comments = {comment.id: comment for comment in Comment.query
+                .options(joinedload(Comment.user), joinedload(Comment.post))
+                .filter(Comment.id.in_(comment_ids))} if comment_ids else {}
+
+    results = []
+    for kind, row_id in hits:
+        if kind == 'post' and row_id in posts:
+            post = posts[row_id]
+            results.append(dict(serialize_post(post, comments=False), type="post", postId=str(post.id)))
+        elif kind == 'comment' and row_id in comments:
+            comment = comments[row_id]
+            results.append(dict(serialize_comment(comment), type="comment", courseId=str(comment.post.courseId)))
+    return results
@@ -0,0 +1,133 @@
+import json
+from operator import attrgetter
+from flask import Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from images import display_url, image_variants
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Wire shapes of the API and the JSON encoding used for every response.
+#
+# IDs are strings and times are ISO 8601 under createdAt, whatever route a
+# post, comment, user or course is returned from. Each serializer reads all
+# of its columns with one precompiled attrgetter call.
+
+# Datetimes are handed to Flask's default hook so responses keep the format
+# of the stdlib encoder
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+# Items encoded per chunk of a streamed array
+STREAM_BATCH = 200
+
+
+def encode(obj):
+    """Encode ``obj`` as compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=DefaultJSONProvider.default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return encode(obj).decode()
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(encode(obj), mimetype=self.mimetype)
+
+
+def stream_json(key, items, serialize, **fields):
+    """Respond with ``{**fields, key: [serialize(item) for item in items]}``, streamed.
+
+    The array is encoded in batches while it is sent, so a long list never
+    sits in memory as one string.
+    """
+    def generate():
+        head = encode(fields)
+        yield head[:-1] + (b',' if fields else b'') + encode(key) + b':['
+        batch = []
+        first = True
+        for item in items:
+            batch.append(serialize(item))
+            if len(batch) == STREAM_BATCH:
+                yield (b'' if first else b',') + encode(batch)[1:-1]
+                batch, first = [], False
+        if batch:
+            yield (b'' if first else b',') + encode(batch)[1:-1]
+        yield b']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+_post_fields = attrgetter('id', 'content', 'timestamp', 'user_id', 'courseId', 'likes', 'image')
+_comment_fields = attrgetter('id', 'content', 'timestamp', 'user_id', 'post_id', 'likes')
+_course_fields = attrgetter('id', 'code', 'name', 'description', 'instructor')
+
+
+def serialize_comment(comment):
+    comment_id, content, timestamp, user_id, post_id, likes = _comment_fields(comment)
+    return {
+        "id": str(comment_id),
+        "content": content,
+        "createdAt": timestamp.isoformat(),
+        "userId": str(user_id),
+        "postId": str(post_id),
+        "username": comment.user.username,
+        "likes": likes or 0
+    }
+
+
+def serialize_post(post, comments=True):
+    """Shared representation of a post, without per-viewer fields."""
+    post_id, content, timestamp, user_id, course_id, likes, image = _post_fields(post)
+    post_data = {
+        "id": str(post_id),
+        "content": content,
+        "createdAt": timestamp.isoformat(),
+        "userId": str(user_id),
+        "courseId": str(course_id),
+        "username": post.user.username,
+        "likes": likes or 0
+    }
+    if comments:
+        post_data["comments"] = [serialize_comment(comment) for comment in post.comments]
+
+    # Add image field only if it exists
+    if image:
+        post_data["image"] = display_url(image, post.image_upload)
+        post_data["imageVariants"] = image_variants(image, post.image_upload)
+    return post_data
+
+
+def serialize_user(user, karma=None):
+    user_data = {
+        "id": str(user.id),
+        "username": user.username,
+        "profilePicture": "placeholder.svg"
+    }
+    if karma is not None:
+        user_data["karma"] = karma
+    return user_data
+
+
+def serialize_course(course, student_count=None):
+    course_id, code, name, description, instructor = _course_fields(course)
+    course_data = {
+        "id": str(course_id),
+        "code": code,
+        "name": name,
+        "description": description,
+        "instructor": instructor
+    }
+    if student_count is not None:
+        course_data["studentCount"] = student_count
+    return course_data
@@ -0,0 +1,254 @@
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from PIL import Image
+from sqlalchemy.exc import IntegrityError
+from models import db, Post, StoredBlob, ImageUpload
+
+# Content-addressed upload storage.
+#
+# Every upload is hashed while it is copied to disk and stored once as
+# static/uploads/ab/cd/<sha256>.<ext>, so the same file posted in twenty
+# courses takes the space of one. StoredBlob.refcount counts the posts using
+# a blob; a blob nobody references is deleted once it has not been uploaded
+# again for UPLOAD_GC_GRACE seconds, which keeps a fresh upload that is not
+# posted yet from being collected under it.
+#
+# A blob's row is written before its file and deleted after it, under the
+# row lock, so uploads and new posts that race a deletion either keep the
+# blob alive or find it gone, never a row without its file.
+
+CHUNK_SIZE = 64 * 1024
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+UPLOAD_URL_PREFIX = '/static/uploads/'
+BLOB_URL_PATTERN = re.compile(r'^/static/uploads/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidImage(Exception):
+    pass
+
+
+def upload_root():
+    return os.path.join(current_app.root_path, 'static', 'uploads')
+
+
+def url_to_path(url):
+    return os.path.join(upload_root(), url[len(UPLOAD_URL_PREFIX):])
+
+
+def blob_name(digest, extension):
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+def _store(tmp_path, digest, extension):
+    # Move a hashed temp file into place unless the blob already exists
+    name = blob_name(digest, extension)
+    path = os.path.join(upload_root(), name)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return UPLOAD_URL_PREFIX + name, path
+
+
+def _record(digest, url, size):
+    """Return ``(blob, created)`` for a stored file, creating its row if needed."""
+    # Waits for a deletion holding the row lock, then finds the row gone
+    touched = StoredBlob.query.filter_by(sha256=digest)\
+        .update({StoredBlob.last_uploaded_at: datetime.utcnow()}, synchronize_session=False)
+    if touched:
+        db.session.commit()
+        return StoredBlob.query.get(digest), False
+
+    try:
+        blob = StoredBlob(sha256=digest, url=url, size=size)
+        db.session.add(blob)
+        db.session.commit()
+        return blob, True
+    except IntegrityError:
+        # The same file was uploaded concurrently
+        db.session.rollback()
+        return StoredBlob.query.get(digest), False
+
+
+def save_image(stream, max_size):
+    """Stream an uploaded image to disk and store it once by content hash.
+
+    Returns ``(blob, path, created)``.
+    """
+    incoming = os.path.join(upload_root(), '.incoming')
+    os.makedirs(incoming, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=incoming)
+
+    try:
+        sha256 = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, 'wb') as f:
+            while chunk := stream.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge()
+                sha256.update(chunk)
+                f.write(chunk)
+
+        # Only the header is parsed here, decoding happens in the pipeline
+        try:
+            with Image.open(tmp_path) as image:
+                extension = FORMAT_EXTENSIONS.get(image.format)
+        except Exception:
+            raise InvalidImage()
+        if extension is None:
+            raise InvalidImage()
+
+        # The row first, a collection that already locked it finishes
+        # deleting the file before the new one is moved into place
+        digest = sha256.hexdigest()
+        blob, created = _record(digest, UPLOAD_URL_PREFIX + blob_name(digest, extension), size)
+        url, path = _store(tmp_path, digest, extension)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return blob, path, created
+
+
+def acquire(url):
+    """Count one more post using ``url``.
+
+    Returns False when ``url`` is a blob that has been deleted, True
+    otherwise. A no-op for files outside the store.
+    """
+    if not url:
+        return True
+    acquired = StoredBlob.query.filter_by(url=url).update(
+        {StoredBlob.refcount: StoredBlob.refcount + 1}, synchronize_session=False
+    )
+    return bool(acquired) or not BLOB_URL_PATTERN.match(url)
+
+
+def release(urls):
+    """Count one post less for each of ``urls``. Call ``collect`` after committing."""
+    for url, count in Counter(url for url in urls if url).items():
+        StoredBlob.query.filter_by(url=url).update(
+            {StoredBlob.refcount: StoredBlob.refcount - count}, synchronize_session=False
+        )
+
+
+def delete_blob(sha256, uploaded_before=None, uploaded_at=None):
+    """Delete a blob no post uses and its variants, returns whether it was deleted.
+
+    The conditions are checked by the DELETE itself, whose lock is held
+    until the files are gone: ``uploaded_before`` skips blobs uploaded
+    since, ``uploaded_at`` blobs uploaded again after that time.
+    """
+    query = StoredBlob.query.filter(StoredBlob.sha256 == sha256, StoredBlob.refcount <= 0)
+    if uploaded_before is not None:
+        query = query.filter(StoredBlob.last_uploaded_at < uploaded_before)
+    if uploaded_at is not None:
+        query = query.filter(StoredBlob.last_uploaded_at == uploaded_at)
+    try:
+        blob = query.with_for_update().first()
+        if blob is None or not query.delete(synchronize_session=False):
+            db.session.rollback()
+            return False
+
+        paths = [url_to_path(blob.url)]
+        upload = ImageUpload.query.filter_by(url=blob.url).first()
+        if upload is not None:
+            paths += [url_to_path(variant["url"]) for variant in (upload.variants or {}).values()]
+            db.session.delete(upload)
+        db.session.flush()
+
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return True
+
+
+def collect(urls=None):
+    """Delete unreferenced blobs past the grace period, optionally only among ``urls``."""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get('UPLOAD_GC_GRACE', 3600))
+    query = db.session.query(StoredBlob.sha256)\
+        .filter(StoredBlob.refcount <= 0)\
+        .filter(StoredBlob.last_uploaded_at < cutoff)
+    if urls is not None:
+        urls = [url for url in urls if url]
+        if not urls:
+            return 0
+        query = query.filter(StoredBlob.url.in_(urls))
+
+    candidates = [sha256 for sha256, in query]
+    return sum(delete_blob(sha256, uploaded_before=cutoff) for sha256 in candidates)
+
+
+def migrate_legacy(process_image):
+    """Move flat ``<uuid>_<name>`` uploads used by posts into the blob store.
+
+    ``process_image(url, path)`` regenerates variants for the new location.
+    Returns the number of files moved.
+    """
+    legacy = db.session.query(Post.image, db.func.count())\
+        .filter(Post.image.like(UPLOAD_URL_PREFIX + '%'))\
+        .filter(~Post.image.in_(db.session.query(StoredBlob.url)))\
+        .group_by(Post.image)\
+        .all()
+
+    moved = 0
+    for old_url, post_count in legacy:
+        old_path = url_to_path(old_url)
+        if not os.path.isfile(old_path):
+            print(f"Skipping missing upload {old_url}")
+            continue
+
+        sha256 = hashlib.sha256()
+        with open(old_path, 'rb') as f:
+            while chunk := f.read(CHUNK_SIZE):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with Image.open(old_path) as image:
+            extension = FORMAT_EXTENSIONS.get(image.format, 'jpg')
+        size = os.path.getsize(old_path)
+
+        # Drop the variants of the old location, they are rebuilt below
+        upload = ImageUpload.query.filter_by(url=old_url).first()
+        if upload is not None:
+            for variant in (upload.variants or {}).values():
+                if variant["url"] != old_url and os.path.exists(url_to_path(variant["url"])):
+                    os.remove(url_to_path(variant["url"]))
+            db.session.delete(upload)
+
+        url, path = _store(old_path, digest, extension)
+        blob = StoredBlob.query.get(digest)
+        if blob is None:
+            blob = StoredBlob(sha256=digest, url=url, size=size, refcount=0)
+            db.session.add(blob)
+        blob.refcount += post_count
+        Post.query.filter_by(image=old_url).update({Post.image: url}, synchronize_session=False)
+
+        if not ImageUpload.query.filter_by(url=url).first():
+            try:
+                variants, status = process_image(url, path), 'ready'
+            except Exception as e:
+                print(f"Error processing image {url}: {str(e)}")
+                variants, status = None, 'failed'
+            db.session.add(ImageUpload(url=url, status=status, variants=variants))
+
+        db.session.commit()
+        moved += 1
+    return moved
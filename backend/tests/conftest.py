@@ -0,0 +1,38 @@
+import os
+import sys
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+
+TEST_CONFIG = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    'SECRET_KEY': 'test',
+    'JWT_SECRET_KEY': 'test-secret-key-of-at-least-32-bytes',
+    'KARMA_FLUSH_INTERVAL': 0,
+    'PASSWORD_HASH_WORKERS': 0,
+    'FEED_CACHE_TYPE': 'null',
+    'COMPRESS_ENABLED': False,
+}
+
+
+def make_app(**config):
+    app = create_app(dict(TEST_CONFIG, **config))
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def auth_header(app, user_id):
+    with app.app_context():
+        return {'Authorization': 'Bearer ' + create_access_token(identity=str(user_id))}
+
+
+@pytest.fixture
+def app():
+    return make_app()
@@ -0,0 +1,71 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from conftest import auth_header, make_app
+from models import db, User, Course, Post, Comment, post_likes
+
+FEEDS = [
+    '/api/post/home',
+    '/api/post/all',
+    '/api/post/my',
+    '/api/courses/1/posts',
+    '/api/users/1/posts',
+]
+
+
+def seed(app, comments_per_post, posts=60):
+    with app.app_context():
+        users = [User(username=f'user{i}', password_hash='x') for i in range(5)]
+        course = Course(name='Course', code='C1', description='d', instructor='i')
+        for user in users:
+            user.courses.append(course)
+        db.session.add_all(users + [course])
+        db.session.flush()
+        for i in range(posts):
+            post = Post(content=f'post {i}', user_id=users[0].id, courseId=course.id)
+            db.session.add(post)
+            db.session.flush()
+            for j in range(comments_per_post):
+                db.session.add(Comment(content='comment', user_id=users[j % 5].id, post_id=post.id))
+            if i % 2:
+                db.session.execute(post_likes.insert().values(user_id=users[0].id, post_id=post.id))
+        db.session.commit()
+
+
+@contextmanager
+def count_statements(app):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+
+@pytest.mark.parametrize('url', FEEDS)
+def test_feed_query_count_is_constant(url):
+    counts = {}
+    for comments_per_post in (1, 4):
+        app = make_app()
+        seed(app, comments_per_post)
+        client = app.test_client()
+        headers = auth_header(app, 1)
+        # Resolve the caller and other per-process state first
+        assert client.get(url, query_string={'limit': 1}, headers=headers).status_code == 200
+
+        for limit in (5, 20):
+            with count_statements(app) as statements:
+                response = client.get(url, query_string={'limit': limit}, headers=headers)
+            assert response.status_code == 200
+            assert len(response.get_json()['posts']) == limit
+            counts[comments_per_post, limit] = len(statements)
+
+    assert len(set(counts.values())) == 1, counts
@@ -0,0 +1,77 @@
+import threading
+
+from sqlalchemy import func
+
+from conftest import auth_header, make_app
+from models import db, User, Course, Post, post_likes
+
+THREADS = 8
+TOGGLES = 25
+
+
+def setup_post(tmp_path):
+    app = make_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "likes.db"}')
+    with app.app_context():
+        users = [User(username=f'user{i}', password_hash='x', karma=0) for i in range(THREADS + 1)]
+        course = Course(name='Course', code='C1', description='d', instructor='i')
+        db.session.add_all(users + [course])
+        db.session.flush()
+        post = Post(content='post', user_id=users[0].id, courseId=course.id, likes=0)
+        db.session.add(post)
+        db.session.commit()
+        return app, post.id, users[0].id, [user.id for user in users[1:]]
+
+
+def hammer(app, post_id, toggles):
+    """Toggle the like from one thread per ``(user_id, count)`` of ``toggles``, all at once."""
+    statuses = []
+    start = threading.Barrier(len(toggles))
+
+    def run(user_id, count):
+        client = app.test_client()
+        headers = auth_header(app, user_id)
+        start.wait()
+        for _ in range(count):
+            statuses.append(client.post(f'/api/post/{post_id}/like', headers=headers).status_code)
+
+    threads = [threading.Thread(target=run, args=toggle) for toggle in toggles]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def like_state(app, post_id, author_id):
+    with app.app_context():
+        liked_by = {row.user_id for row in db.session.query(post_likes.c.user_id).filter_by(post_id=post_id)}
+        rows = db.session.query(func.count()).select_from(post_likes).filter_by(post_id=post_id).scalar()
+        likes = db.session.query(Post.likes).filter_by(id=post_id).scalar()
+        karma = db.session.query(User.karma).filter_by(id=author_id).scalar()
+    return liked_by, rows, likes, karma
+
+
+def test_concurrent_likes_of_different_users(tmp_path):
+    app, post_id, author_id, liker_ids = setup_post(tmp_path)
+    # Odd toggle counts leave a like behind, even ones remove it again
+    toggles = [(user_id, TOGGLES + i % 2) for i, user_id in enumerate(liker_ids)]
+
+    assert set(hammer(app, post_id, toggles)) == {200}
+
+    liked_by, rows, likes, karma = like_state(app, post_id, author_id)
+    assert liked_by == {user_id for user_id, count in toggles if count % 2}
+    assert rows == len(liked_by)
+    assert likes == rows
+    assert karma == rows
+
+
+def test_concurrent_toggles_of_one_user(tmp_path):
+    app, post_id, author_id, liker_ids = setup_post(tmp_path)
+
+    assert set(hammer(app, post_id, [(liker_ids[0], TOGGLES)] * THREADS)) == {200}
+
+    liked_by, rows, likes, karma = like_state(app, post_id, author_id)
+    assert liked_by <= {liker_ids[0]}
+    assert rows == len(liked_by)
+    assert likes == rows
+    assert karma == rows
@@ -0,0 +1,194 @@
+from flask import current_app
+from sqlalchemy import and_, func, literal, or_, select, tuple_
+from models import db, Post, TimelineEntry, user_courses
+from feed import feed_query
+from serializers import serialize_post
+from pagination import encode_cursor
+
+# Materialized home timelines (fan-out on write).
+#
+# With HOME_TIMELINE_ENABLED a new post is pushed onto the timeline of every
+# student in its course, and the home feed reads that one list instead of
+# merging every enrolled course. Courses with more than TIMELINE_FANOUT_LIMIT
+# students are not fanned out; their posts are merged in at read time. Each
+# timeline keeps at most TIMELINE_MAX_LENGTH entries, and pages past the end
+# of a timeline are served by the regular fan-out-on-read feed.
+
+
+def enabled():
+    return current_app.config.get('HOME_TIMELINE_ENABLED', False)
+
+
+def _max_length():
+    return current_app.config.get('TIMELINE_MAX_LENGTH', 800)
+
+
+def _student_count(course_id):
+    return db.session.query(func.count())\
+        .select_from(user_courses)\
+        .filter(user_courses.c.courseId == course_id)\
+        .scalar()
+
+
+def is_large(course_id):
+    return _student_count(course_id) > current_app.config.get('TIMELINE_FANOUT_LIMIT', 500)
+
+
+def large_course_ids(course_ids):
+    if not course_ids:
+        return []
+    limit = current_app.config.get('TIMELINE_FANOUT_LIMIT', 500)
+    rows = db.session.query(user_courses.c.courseId)\
+        .filter(user_courses.c.courseId.in_(course_ids))\
+        .group_by(user_courses.c.courseId)\
+        .having(func.count() > limit)\
+        .all()
+    return [row.courseId for row in rows]
+
+
+def _insert_ignore():
+    return TimelineEntry.__table__.insert()\
+        .prefix_with('IGNORE', dialect='mysql')\
+        .prefix_with('OR IGNORE', dialect='sqlite')
+
+
+def fan_out(post):
+    """Push a new post onto the timeline of every student in its course."""
+    if not enabled() or is_large(post.courseId):
+        return
+
+    students = select(user_courses.c.user_id, literal(post.id), literal(post.timestamp))\
+        .where(user_courses.c.courseId == post.courseId)
+    db.session.execute(_insert_ignore().from_select(['user_id', 'post_id', 'timestamp'], students))
+    trim(post.courseId)
+
+
+def rebuild_user(user_id):
+    """Refill a timeline with the newest posts of the user's fanned-out courses.
+
+    A timeline only promises to hold every post newer than its oldest
+    entry, which merging one more course into a trimmed timeline cannot
+    keep, so backfilling recomputes the whole list in one statement.
+    """
+    TimelineEntry.query.filter(TimelineEntry.user_id == user_id).delete(synchronize_session=False)
+
+    course_ids = [row.courseId for row in db.session.query(user_courses.c.courseId)
+                  .filter(user_courses.c.user_id == user_id)]
+    large_ids = set(large_course_ids(course_ids))
+    small_ids = [course_id for course_id in course_ids if course_id not in large_ids]
+    if not small_ids:
+        return
+
+    newest = select(literal(user_id), Post.id, Post.timestamp)\
+        .where(Post.courseId.in_(small_ids))\
+        .order_by(Post.timestamp.desc(), Post.id.desc())\
+        .limit(_max_length())
+    db.session.execute(_insert_ignore().from_select(['user_id', 'post_id', 'timestamp'], newest))
+
+
+def backfill(user_ids, course_id):
+    """Bring a course's posts onto the timelines of newly enrolled ``user_ids``."""
+    if not enabled() or is_large(course_id):
+        return
+    for user_id in user_ids:
+        rebuild_user(user_id)
+
+
+def prune(user_id, course_id):
+    """Remove a course's posts from a timeline after unenrolling."""
+    if not enabled():
+        return
+    course_posts = select(Post.id).where(Post.courseId == course_id)
+    TimelineEntry.query\
+        .filter(TimelineEntry.user_id == user_id)\
+        .filter(TimelineEntry.post_id.in_(course_posts))\
+        .delete(synchronize_session=False)
+
+    # A course that just dropped back under the limit had its recent posts
+    # merged at read time, so its students need them on their timelines now.
+    if _student_count(course_id) == current_app.config.get('TIMELINE_FANOUT_LIMIT', 500):
+        students = [row.user_id for row in db.session.query(user_courses.c.user_id)
+                    .filter(user_courses.c.courseId == course_id)]
+        backfill(students, course_id)
+
+
+def remove_posts(*criteria):
+    """Drop timeline entries of the posts matching ``criteria`` before they are deleted."""
+    posts = select(Post.id).where(*criteria)
+    TimelineEntry.query\
+        .filter(TimelineEntry.post_id.in_(posts))\
+        .delete(synchronize_session=False)
+
+
+def trim(course_id):
+    """Drop the entries past the first TIMELINE_MAX_LENGTH of every timeline of a course's students.
+
+    One statement ranks the entries of those timelines and deletes the
+    overflow, which is at most one entry per student after a fan-out.
+    """
+    students = select(user_courses.c.user_id).where(user_courses.c.courseId == course_id)
+    ranked = select(
+        TimelineEntry.user_id, TimelineEntry.post_id,
+        func.row_number().over(
+            partition_by=TimelineEntry.user_id,
+            order_by=(TimelineEntry.timestamp.desc(), TimelineEntry.post_id.desc())
+        ).label('position')
+    ).where(TimelineEntry.user_id.in_(students)).subquery()
+    # Selected through a derived table, MySQL cannot delete from a table
+    # its own subquery reads directly
+    overflow = select(ranked.c.user_id, ranked.c.post_id).where(ranked.c.position > _max_length())
+    TimelineEntry.query\
+        .filter(tuple_(TimelineEntry.user_id, TimelineEntry.post_id).in_(overflow))\
+        .delete(synchronize_session=False)
+
+
+def _newer_than(timestamp_column, id_column, before):
+    timestamp, row_id = before
+    return or_(timestamp_column < timestamp, and_(timestamp_column == timestamp, id_column < row_id))
+
+
+def home_page(user_id, course_ids, limit, before=None):
+    """One serialized home feed page read from the user's timeline.
+
+    Returns None when the page reaches past the end of the timeline, in
+    which case the caller falls back to the fan-out-on-read feed.
+    """
+    entries = db.session.query(TimelineEntry.post_id, TimelineEntry.timestamp)\
+        .filter(TimelineEntry.user_id == user_id)
+    if before:
+        entries = entries.filter(_newer_than(TimelineEntry.timestamp, TimelineEntry.post_id, before))
+    entries = entries\
+        .order_by(TimelineEntry.timestamp.desc(), TimelineEntry.post_id.desc())\
+        .limit(limit + 1)\
+        .all()
+    if len(entries) <= limit:
+        return None
+
+    rows = {entry.post_id: entry.timestamp for entry in entries}
+
+    # Posts of large courses are not fanned out, merge them in here
+    large_ids = large_course_ids(course_ids)
+    if large_ids:
+        large = db.session.query(Post.id, Post.timestamp).filter(Post.courseId.in_(large_ids))
+        if before:
+            large = large.filter(_newer_than(Post.timestamp, Post.id, before))
+        large = large.order_by(Post.timestamp.desc(), Post.id.desc()).limit(limit + 1).all()
+        rows.update((post.id, post.timestamp) for post in large)
+
+    ordered = sorted(rows.items(), key=lambda row: (row[1], row[0]), reverse=True)
+    page_ids = [post_id for post_id, _ in ordered[:limit]]
+    posts = {post.id: post for post in feed_query(Post.id.in_(page_ids)).all()}
+
+    last_id, last_timestamp = ordered[limit - 1]
+    return {
+        "posts": [serialize_post(posts[post_id]) for post_id in page_ids if post_id in posts],
+        "nextCursor": encode_cursor(last_timestamp, last_id)
+    }
+
+
+def rebuild():
+    """Rebuild every timeline from scratch, e.g. after turning the mode on."""
+    TimelineEntry.query.delete(synchronize_session=False)
+    for row in db.session.query(user_courses.c.user_id).distinct().all():
+        rebuild_user(row.user_id)
+    db.session.commit()
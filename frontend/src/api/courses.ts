@@ -13,7 +13,8 @@ export interface Course {
   name: string;
   description: string;
   instructor: string;
-  enrolledStudents: string[];
+  studentCount?: number;
+  isEnrolled?: boolean;
 }
 
 export const getAllCourses = async () => {
@@ -76,6 +77,27 @@ export const getCourseById = async (courseId: string) => {
   }
 };
 
+export interface Student {
+  id: string;
+  username: string;
+}
+
+export const getCourseStudents = async (courseId: string, after?: string) => {
+  const params = new URLSearchParams();
+  if (after) params.set("after", after);
+  const response = await fetch(`${API_BASE_URL}/api/courses/${courseId}/students?${params}`, {
+    method: "GET",
+    headers: {
+      "Content-Type": "application/json",
+      ...getAuthHeader(),
+    },
+  });
+  if (!response.ok) {
+    throw new Error('Failed to fetch course students');
+  }
+  return await response.json() as { students: Student[]; nextCursor: string | null };
+};
+
 export const fetchCourseById = async (courseId: string) => {
   try {
     const response = await fetch(`http://localhost/api/courses/${courseId}`);
@@ -19,6 +19,11 @@ export interface Post {
   createdAt: string;
 }
 
+export interface PostPage {
+  posts: Post[];
+  nextCursor: string | null;
+}
+
 export interface Comment {
   id: string;
   userId: string;
@@ -128,13 +133,20 @@ export const deleteComment = async (commentId: string): Promise<boolean> => {
   }
 };
 
-export const getHomePosts = async (): Promise<boolean> => {
+// Pages come newest first, pass the nextCursor of a page to get the one after it
+const pageParams = (before?: string) => {
+  const params = new URLSearchParams();
+  if (before) params.set("before", before);
+  return params;
+};
+
+export const getHomePosts = async (before?: string): Promise<PostPage> => {
   try {
-    const response = await fetch(`http://localhost:5000/api/post/home`, {
+    const response = await fetch(`${API_BASE_URL}/api/post/home?${pageParams(before)}`, {
       method: 'GET',
       headers: {
-        'Authorization': `Bearer ${localStorage.getItem('access_token')}`,
-        'Content-Type': 'application/json'
+        'Content-Type': 'application/json',
+        ...getAuthHeader(),
       }
     });
     
@@ -142,19 +154,19 @@ export const getHomePosts = async (): Promise<boolean> => {
       throw new Error('Failed to fetch posts');
     }
     
-    return response.json();
+    return await response.json();
   } catch (error) {
     toast.error("Failed to fetch posts");
     throw error;
   }
 };
 
-export const getMyPosts = async (): Promise<Post[]> => {
+export const getMyPosts = async (before?: string): Promise<PostPage> => {
   try {
-    const response = await fetch(`http://localhost:5000/api/post/my`, {
+    const response = await fetch(`${API_BASE_URL}/api/post/my?${pageParams(before)}`, {
       method: 'GET',
       headers: {
-        'Authorization': `Bearer ${localStorage.getItem('access_token')}`
+        ...getAuthHeader(),
       }
     });
     
@@ -162,17 +174,16 @@ export const getMyPosts = async (): Promise<Post[]> => {
       throw new Error('Failed to fetch posts');
     }
     
-    const posts = await response.json();
-    return posts;
+    return await response.json();
   } catch (error) {
     toast.error("Failed to fetch posts");
     throw error;
   }
 };
 
-export const getPostsByCourseId = async (courseId: string) => {
+export const getPostsByCourseId = async (courseId: string, before?: string): Promise<PostPage> => {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/courses/${courseId}/posts`, {
+    const response = await fetch(`${API_BASE_URL}/api/courses/${courseId}/posts?${pageParams(before)}`, {
       method: "GET",
       headers: {
         "Content-Type": "application/json",
@@ -182,8 +193,7 @@ export const getPostsByCourseId = async (courseId: string) => {
     if (!response.ok) {
       throw new Error('Failed to fetch posts');
     }
-    const userData = await response.json();
-    return userData.posts;
+    return await response.json();
   } catch (error) {
     toast.error("Failed to fetch posts");
     throw error;
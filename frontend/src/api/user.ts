@@ -15,7 +15,8 @@ export interface Course {
   name: string;
   description: string;
   instructor: string;
-  enrolledStudents: string[];
+  studentCount?: number;
+  isEnrolled?: boolean;
 }
 
 export const getUserById = async (userId: string): Promise<User> => {
@@ -38,14 +39,15 @@ export const getCurrentUser = async (): Promise<User> => {
   return response.data;
 };
 
-export const getUserPosts = async (userId: string): Promise<any[]> => {
+export const getUserPosts = async (userId: string, before?: string): Promise<{ posts: any[]; nextCursor: string | null }> => {
   const token = localStorage.getItem('access_token');
   const response = await axios.get(`${API_BASE_URL}/api/users/${userId}/posts`, {
+    params: before ? { before } : undefined,
     headers: {
       Authorization: `Bearer ${token}`
     }
   });
-  return response.data.posts;
+  return response.data;
 };
 
 export const getUserCourses = async (userId: string): Promise<Course[]> => {
@@ -13,6 +13,14 @@ import { getCourseById, type Course, leaveCourse } from "@/api/courses";
 import { Button } from "@/components/ui/button";
 import { useToast } from "@/components/ui/use-toast";
 
+// Ensure each post has all required fields
+const formatPost = (post: PostType): PostType => ({
+  ...post,
+  comments: post.comments || [],
+  likes: post.likes || 0,
+  createdAt: post.createdAt || new Date().toISOString()
+});
+
 const Course = () => {
   const { courseId } = useParams<{ courseId: string }>();
   const [coursePosts, setCoursePosts] = useState<PostType[]>([]);
@@ -21,6 +29,8 @@ const Course = () => {
   const [isJoinDialogOpen, setIsJoinDialogOpen] = useState(false);
   const [course, setCourse] = useState<Course | undefined>();
   const { toast } = useToast();
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
 
   useEffect(() => {
     if (!courseId) {
@@ -30,19 +40,13 @@ const Course = () => {
 
     const loadData = async () => {
       try {
-        const [courseData, posts] = await Promise.all([
+        const [courseData, page] = await Promise.all([
           getCourseById(courseId),
           getPostsByCourseId(courseId)
         ]);
         setCourse(courseData);
-        // Ensure each post has all required fields
-        const formattedPosts = posts.map(post => ({
-          ...post,
-          comments: post.comments || [],
-          likes: post.likes || 0,
-          createdAt: post.createdAt || new Date().toISOString()
-        }));
-        setCoursePosts(formattedPosts);
+        setCoursePosts(page.posts.map(formatPost));
+        setNextCursor(page.nextCursor);
       } catch (error) {
         console.error("Failed to load data:", error);
         navigate("/");
@@ -52,6 +56,21 @@ const Course = () => {
     loadData();
   }, [courseId, navigate]);
 
+  const handleLoadMore = async () => {
+    if (!courseId || !nextCursor) return;
+
+    setIsLoadingMore(true);
+    try {
+      const page = await getPostsByCourseId(courseId, nextCursor);
+      setCoursePosts(prev => [...prev, ...page.posts.map(formatPost)]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error("Failed to load more posts:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const handlePostCreated = (newPost: PostType) => {
     // Extract the post data from the response
     const postData = newPost.post || newPost;
@@ -117,7 +136,7 @@ const Course = () => {
                       <p className="text-gray-400">Instructor: {course.instructor}</p>
                     </div>
                   </div>
-                  {isAuthenticated && currentUser && course.enrolledStudents.includes(currentUser.id) && (
+                  {isAuthenticated && currentUser && course.isEnrolled && (
                     <Button
                       variant="destructive"
                       size="sm"
@@ -134,13 +153,13 @@ const Course = () => {
                 
                 <div className="flex items-center gap-1 text-gray-400">
                   <Users className="h-4 w-4" />
-                  <span>{course.enrolledStudents.length} students enrolled</span>
+                  <span>{course.studentCount ?? 0} students enrolled</span>
                 </div>
               </div>
             </div>
             
             {/* Post creation form */}
-            {isAuthenticated && currentUser && course.enrolledStudents.includes(currentUser.id) && (
+            {isAuthenticated && currentUser && course.isEnrolled && (
               <PostForm onPostCreated={handlePostCreated} courseId={courseId} />
             )}
             
@@ -165,13 +184,21 @@ const Course = () => {
                   <p className="text-gray-500 mb-4 text-center">
                     Be the first to start a discussion in this course!
                   </p>
-                  {isAuthenticated && currentUser && course.enrolledStudents.includes(currentUser.id) && (
+                  {isAuthenticated && currentUser && course.isEnrolled && (
                     <p className="text-gray-400 text-center">
                       Use the form above to create the first post.
                     </p>
                   )}
                 </div>
               )}
+
+              {nextCursor && (
+                <div className="flex justify-center">
+                  <Button variant="outline" onClick={handleLoadMore} disabled={isLoadingMore}>
+                    {isLoadingMore ? "Loading..." : "Load more"}
+                  </Button>
+                </div>
+              )}
             </div>
           </div>
         </SidebarInset>
@@ -9,19 +9,23 @@ import CourseSidebar from "@/components/CourseSidebar";
 import { SidebarProvider, SidebarInset } from "@/components/ui/sidebar";
 import CourseJoinDialog from "@/components/CourseJoinDialog";
 import { getHomePosts } from "@/api/post";
+import { Button } from "@/components/ui/button";
 
 const Index = () => {
   const [allPosts, setAllPosts] = useState<PostType[]>([]);
   const { isAuthenticated } = useAuth();
   const [isJoinDialogOpen, setIsJoinDialogOpen] = useState(false);
   const [isLoading, setIsLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
 
   useEffect(() => {
     const fetchPosts = async () => {
       if (isAuthenticated) {
         try {
-          const posts = await getHomePosts();
-          setAllPosts(posts["posts"]);
+          const page = await getHomePosts();
+          setAllPosts(page.posts);
+          setNextCursor(page.nextCursor);
         } catch (error) {
           console.error("Failed to fetch posts:", error);
         } finally {
@@ -35,6 +39,21 @@ const Index = () => {
     fetchPosts();
   }, [isAuthenticated]);
 
+  const handleLoadMore = async () => {
+    if (!nextCursor) return;
+
+    setIsLoadingMore(true);
+    try {
+      const page = await getHomePosts(nextCursor);
+      setAllPosts(prev => [...prev, ...page.posts]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error("Failed to fetch more posts:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const handlePostCreated = (newPost: PostType) => {
     setAllPosts(prev => [newPost, ...prev]);
   };
@@ -73,6 +92,14 @@ const Index = () => {
                     <p className="text-foodle-text">No posts yet. Be the first to create a post!</p>
                   </div>
                 )}
+
+                {nextCursor && (
+                  <div className="flex justify-center">
+                    <Button variant="outline" onClick={handleLoadMore} disabled={isLoadingMore}>
+                      {isLoadingMore ? "Loading..." : "Load more"}
+                    </Button>
+                  </div>
+                )}
               </div>
               
               {/* Right Sidebar - Profile */}
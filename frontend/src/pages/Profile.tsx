@@ -19,6 +19,8 @@ const Profile = () => {
   const [profileUser, setProfileUser] = useState<User | null>(null);
   const [activeTab, setActiveTab] = useState("posts");
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
   const { currentUser, isAuthenticated } = useAuth();
   const navigate = useNavigate();
   const [isJoinDialogOpen, setIsJoinDialogOpen] = useState(false);
@@ -34,8 +36,9 @@ const Profile = () => {
         setProfileUser(userData);
 
         // Fetch user posts
-        const posts = await getUserPosts(userData.id);
-        setUserPosts(posts);
+        const page = await getUserPosts(userData.id);
+        setUserPosts(page.posts);
+        setNextCursor(page.nextCursor);
 
         // Fetch user courses
         const courses = await getUserCourses(userData.id);
@@ -54,6 +57,21 @@ const Profile = () => {
     }
   }, [userId, isAuthenticated, navigate]);
 
+  const handleLoadMore = async () => {
+    if (!profileUser || !nextCursor) return;
+
+    setIsLoadingMore(true);
+    try {
+      const page = await getUserPosts(profileUser.id, nextCursor);
+      setUserPosts(prev => [...prev, ...page.posts]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      console.error("Error fetching more posts:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const handleStartChat = async () => {
     if (!profileUser) return;
     
@@ -195,6 +213,14 @@ const Profile = () => {
                     {userPosts.map(post => (
                       <Post key={post.id} post={post} />
                     ))}
+
+                    {nextCursor && (
+                      <div className="flex justify-center">
+                        <Button variant="outline" onClick={handleLoadMore} disabled={isLoadingMore}>
+                          {isLoadingMore ? "Loading..." : "Load more"}
+                        </Button>
+                      </div>
+                    )}
                   </div>
                 ) : (
                   <div className="food-card flex flex-col items-center justify-center p-8">